@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Chat Log Archiving
+Moves chat_logs rows older than the hot window into monthly
+chat_logs_YYYYMM tables, a batch per short transaction so the running
+server keeps writing chat logs meanwhile. Partitions older than
+CHAT_LOG_ARCHIVE_KEEP_MONTHS are then dropped (0 keeps them all), and the
+WAL is checkpointed; --vacuum also rebuilds the database file to return
+the freed space to the OS, which blocks writers while it runs.
+
+Usage: python archive_chat_logs.py [--dry-run] [--vacuum] [hot_days]
+"""
+from datetime import datetime, timedelta
+import sys
+
+from src.chat_archive import archive, compact, drop_partitions, partitions
+from src.db_ops import db
+from src.utils import config
+
+
+def main():
+    args = sys.argv[1:]
+    dry_run = "--dry-run" in args
+    vacuum = "--vacuum" in args
+    positional = [a for a in args if not a.startswith("--")]
+    hot_days = float(positional[0]) if positional else config.CHAT_LOG_HOT_DAYS
+
+    if dry_run:
+        cutoff = (datetime.utcnow() - timedelta(days=hot_days)).isoformat()
+        rows = db.fetchall(
+            """
+            SELECT substr(created_at, 1, 7) AS month, COUNT(*) AS count
+            FROM chat_logs WHERE created_at < ? GROUP BY month ORDER BY month
+        """,
+            (cutoff,),
+        )
+        for row in rows:
+            print(f"would archive {row['count']} rows from {row['month']}")
+        print(
+            f"\nWould archive {sum(r['count'] for r in rows)} rows older than "
+            f"{hot_days:g} days ({len(partitions(db))} partitions exist)"
+        )
+        return
+
+    result = archive(
+        db,
+        hot_days=hot_days,
+        batch_size=config.CHAT_LOG_ARCHIVE_BATCH,
+        pause=config.CHAT_LOG_ARCHIVE_PAUSE_MS / 1000,
+    )
+    print(
+        f"Archived {result['moved']} rows older than {hot_days:g} days "
+        f"in {result['batches']} batches"
+    )
+    if config.CHAT_LOG_ARCHIVE_KEEP_MONTHS > 0:
+        for month in drop_partitions(db, config.CHAT_LOG_ARCHIVE_KEEP_MONTHS):
+            print(f"dropped partition chat_logs_{month}")
+    compact(db, vacuum=vacuum)
+    print(f"{len(partitions(db))} archive partitions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Image Variant Backfill
+Generates the thumb/card/full WebP variants for images uploaded before
+variants existed (or all of them with --force) and reports how much
+smaller the card variants are than the originals listing pages used to load.
+Needs Pillow. Cached catalog responses of a running server pick the new
+variants up after its next catalog change or restart.
+
+Usage: python backfill_images.py [--force]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+
+from src.images import Image, generate_variants, is_resizable, variant_file
+from src.uploads import UPLOAD_FOLDERS, TEMP_PREFIX
+from src.utils import config
+
+
+def originals(root="images"):
+    for folder in UPLOAD_FOLDERS:
+        for directory, _, names in os.walk(os.path.join(root, folder)):
+            for name in sorted(names):
+                if not name.startswith(TEMP_PREFIX):
+                    path = os.path.join(directory, name)
+                    if is_resizable(path):
+                        yield path
+
+
+def main():
+    if Image is None:
+        print("Pillow is not installed: pip install Pillow")
+        return 1
+    force = "--force" in sys.argv[1:]
+    paths = list(originals())
+    print(f"Generating variants for {len(paths)} images...")
+
+    with ThreadPoolExecutor(max_workers=config.IMAGE_VARIANT_WORKERS) as pool:
+        results = list(pool.map(lambda p: generate_variants(p, force), paths))
+
+    written = sum(len(r) for r in results)
+    original_bytes = card_bytes = 0
+    for path in paths:
+        card = variant_file(path, "card")
+        if os.path.exists(card):
+            original_bytes += os.path.getsize(path)
+            card_bytes += os.path.getsize(card)
+    print(f"Wrote {written} variant files")
+    if card_bytes:
+        print(
+            f"Card images: {original_bytes / 1024:.0f} KB of originals -> "
+            f"{card_bytes / 1024:.0f} KB ({original_bytes / card_bytes:.1f}x smaller)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Database Concurrency Benchmark
+Compares catalog read latency under mixed chat traffic for the two ways a
+route handler can reach SQLite:
+
+  sync   - plain `def` handlers on Starlette's shared 40-thread pool, where
+           each chat request holds its thread for the whole model round trip
+  async  - `async def` handlers awaiting AsyncDatabase, whose queries run on
+           a dedicated executor while the model call awaits on the loop
+
+Requests arrive open-loop at a fixed rate, like real traffic would.
+
+Usage: python benchmark_db.py [requests] [chat_ratio] [upstream_ms] [rate_per_s]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import anyio
+import anyio.to_thread
+
+# Point the app at a throwaway database before src.db_ops is imported
+os.chdir(tempfile.mkdtemp(prefix="rental-bench-"))
+
+from src.db_ops import AsyncDatabase, Database  # noqa: E402
+
+READ_SQL = "SELECT * FROM cars WHERE available = 1"
+WRITE_SQL = """
+    INSERT INTO chat_logs (session_id, user_email, role, message, created_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def seed(db: Database, cars: int = 200) -> None:
+    # init_db creates the pre-migration chat_logs schema; match the app's
+    db.execute("DROP TABLE IF EXISTS chat_logs")
+    db.execute(
+        """
+        CREATE TABLE chat_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            user_email TEXT,
+            role TEXT NOT NULL,
+            message TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """
+    )
+    for i in range(cars):
+        db.insert(
+            """
+            INSERT INTO cars (name, model, price_per_day, seats, transmission, fuel_type, images, description, available)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+            """,
+            (f"Car {i}", "Model", 1000 + i, 5, "manual", "petrol", "[]", "x" * 400),
+        )
+
+
+def chat_params(i: int):
+    return (f"sess_{i % 50}", None, "user", "hello there", "2025-01-01T00:00:00")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def arrive(i: int, rate: float) -> None:
+    await asyncio.sleep(i / rate)
+
+
+async def run_sync(
+    db: Database, requests: int, chat_ratio: float, upstream: float, rate: float
+):
+    limiter = anyio.CapacityLimiter(40)  # Starlette's default threadpool size
+    read_latencies = []
+
+    def read():
+        db.fetchall_dicts(READ_SQL)
+
+    def chat(i):
+        db.insert(WRITE_SQL, chat_params(i))
+        time.sleep(upstream)  # synchronous model call holds the thread
+        db.insert(WRITE_SQL, chat_params(i))
+
+    async def one(i):
+        await arrive(i, rate)
+        if i % int(1 / chat_ratio) == 0:
+            await anyio.to_thread.run_sync(chat, i, limiter=limiter)
+        else:
+            start = time.perf_counter()
+            await anyio.to_thread.run_sync(read, limiter=limiter)
+            read_latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return read_latencies
+
+
+async def run_async(
+    adb: AsyncDatabase, requests: int, chat_ratio: float, upstream: float, rate: float
+):
+    read_latencies = []
+
+    async def one(i):
+        await arrive(i, rate)
+        if i % int(1 / chat_ratio) == 0:
+            await adb.insert(WRITE_SQL, chat_params(i))
+            await asyncio.sleep(upstream)  # async model call yields the loop
+            await adb.insert(WRITE_SQL, chat_params(i))
+        else:
+            start = time.perf_counter()
+            await adb.fetchall_dicts(READ_SQL)
+            read_latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return read_latencies
+
+
+def report(label, latencies, elapsed):
+    ms = [v * 1000 for v in latencies]
+    print(
+        f"{label:<6} reads={len(ms):<5} p50={statistics.median(ms):8.1f}ms "
+        f"p99={percentile(ms, 99):8.1f}ms max={max(ms):8.1f}ms "
+        f"wall={elapsed:6.2f}s"
+    )
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    chat_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    upstream = (float(sys.argv[3]) if len(sys.argv) > 3 else 1000) / 1000
+    rate = float(sys.argv[4]) if len(sys.argv) > 4 else 300
+
+    db = Database()
+    seed(db)
+    adb = AsyncDatabase(db)
+
+    print(
+        f"{requests} requests, {chat_ratio:.0%} chat, "
+        f"{upstream * 1000:.0f}ms upstream, {rate:.0f} req/s, pool={db.pool.size}"
+    )
+    start = time.perf_counter()
+    latencies = asyncio.run(run_sync(db, requests, chat_ratio, upstream, rate))
+    report("sync", latencies, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    latencies = asyncio.run(run_async(adb, requests, chat_ratio, upstream, rate))
+    report("async", latencies, time.perf_counter() - start)
+    adb.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Row Decoding Benchmark
+Compares the old heuristic decoder (json.loads on every string that starts
+with a bracket) against the typed, precompiled row decoder in src.db over
+10k rows shaped like the catalog tables.
+
+Usage: python benchmark_row_decode.py [rows] [repeats]
+"""
+import json
+import sqlite3
+import sys
+import time
+
+from src.db import row_decoder
+
+
+def legacy_row_to_dict(row: sqlite3.Row):
+    """The pre-registry implementation of src.db.row_to_dict."""
+    d = dict(row)
+    for key, val in d.items():
+        if isinstance(val, str) and (val.startswith("[") or val.startswith("{")):
+            try:
+                d[key] = json.loads(val)
+            except Exception:
+                pass
+    return d
+
+
+def build(rows: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        """
+        CREATE TABLE picnic_spots (
+            id INTEGER PRIMARY KEY, name TEXT, price REAL, location TEXT,
+            images TEXT, short_description TEXT, detailed_description TEXT,
+            trip_images TEXT, hotel_images TEXT, available BOOLEAN
+        )
+    """
+    )
+    images = json.dumps([f"/images/spots/photo_{i}.jpg" for i in range(4)])
+    conn.executemany(
+        "INSERT INTO picnic_spots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (
+                i,
+                f"Spot {i}",
+                1500.0 + i,
+                "Lonavala",
+                images,
+                # Looks like JSON to the heuristic, which then fails to parse it
+                "[Monsoon special] waterfalls and hills",
+                "A long description of the destination. " * 20,
+                images,
+                "[]",
+                1,
+            )
+            for i in range(rows)
+        ],
+    )
+    return conn
+
+
+def timed(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    conn = build(rows)
+    sql = "SELECT * FROM picnic_spots"
+
+    def old():
+        conn.row_factory = sqlite3.Row
+        return [legacy_row_to_dict(r) for r in conn.execute(sql).fetchall()]
+
+    def new():
+        conn.row_factory = None
+        cur = conn.execute(sql)
+        decode = row_decoder(tuple(d[0] for d in cur.description), "picnic_spots")
+        return [decode(r) for r in cur.fetchall()]
+
+    old_time, old_rows = timed(old, repeats)
+    new_time, new_rows = timed(new, repeats)
+    assert old_rows == new_rows
+
+    print(f"{rows} rows, best of {repeats}")
+    print(f"heuristic  {old_time * 1000:8.1f}ms")
+    print(f"typed      {new_time * 1000:8.1f}ms  ({old_time / new_time:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
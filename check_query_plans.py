@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Query Plan Check
+Runs EXPLAIN QUERY PLAN over every SQL string in src/api/*.py and the
+src/*.py modules they use, plus the
+dynamically built catalog listing queries, against a freshly initialised
+and migrated database. Fails if any query reads a table that can grow
+large in full (a SCAN, even one walking an index) or sorts rows from one in
+a temporary b-tree, unless the SQL is marked with a /* full scan */
+comment. f-strings are rendered with the real tables and columns they are
+built from (DYNAMIC_PARTS); one that can't be rendered fails too.
+
+Usage: python check_query_plans.py [-v]
+"""
+import ast
+import glob
+import itertools
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Tables that grow with traffic or catalog size. A full scan on "admin" is fine.
+LARGE_TABLES = {
+    "cars",
+    "picnic_spots",
+    "users",
+    "sessions",
+    "chat_logs",
+    "chat_log_archive_sessions",
+    "last_trips",
+    "last_trip_comments",
+}
+
+# Archive partitions (chat_logs_YYYYMM) are large too; the check database
+# gets one so queries on them can be planned
+PARTITION_MONTH = "202601"
+PARTITION = re.compile(r"chat_logs_\d{6}")
+
+# Queries that read a table in full on purpose (batch jobs) carry this comment
+FULL_SCAN_MARKER = "/* full scan */"
+
+# What each f-string interpolation in a module stands for, by its source.
+# Every combination is planned, so a helper used with several tables is
+# checked against each. None marks a query prefix whose complete queries
+# are checked elsewhere. Interpolations not listed here fail the check.
+SET_LIST = ["id = id"]
+DYNAMIC_PARTS = {
+    "src/api/cars.py": {"', '.join(update_fields)": SET_LIST},
+    "src/api/spots.py": {"', '.join(update_fields)": SET_LIST},
+    "src/api/last_trips.py": {"', '.join(fields)": SET_LIST},
+    "src/chat_archive.py": {
+        "table": [f"chat_logs_{PARTITION_MONTH}"],
+        "partition_name(month)": [f"chat_logs_{PARTITION_MONTH}"],
+    },
+    # Keyset listings; see catalog_queries()
+    "src/pagination.py": {"table": None},
+    "src/uploads.py": {"table": "IMAGE_COLUMNS", "', '.join(columns)": ["id"]},
+}
+
+SQL_START = re.compile(r"(SELECT|UPDATE|DELETE|INSERT|WITH)\s", re.IGNORECASE)
+
+
+def is_large(table):
+    return table in LARGE_TABLES or bool(PARTITION.fullmatch(table))
+
+
+def dynamic_values(rel, expr):
+    """The values an interpolation is rendered with; KeyError if unknown."""
+    values = DYNAMIC_PARTS[rel][expr]
+    if values == "IMAGE_COLUMNS":
+        from src.db import IMAGE_COLUMNS
+
+        values = sorted(IMAGE_COLUMNS)
+    return values
+
+
+def render(rel, node):
+    """
+    Every rendering of an f-string as (sql, None), or [(None, error)] when
+    an interpolation isn't in DYNAMIC_PARTS; [] for a query prefix.
+    """
+    parts = []
+    for value in node.values:
+        if isinstance(value, ast.Constant):
+            parts.append([value.value])
+            continue
+        expr = ast.unparse(value.value)
+        try:
+            values = dynamic_values(rel, expr)
+        except KeyError:
+            return [(None, f"no rendering for {{{expr}}} in DYNAMIC_PARTS")]
+        if values is None:
+            return []
+        parts.append(values)
+    return [("".join(combo), None) for combo in itertools.product(*parts)]
+
+
+def string_renderings(rel, node):
+    """(text, error) renderings of a string literal node, [] for other nodes."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [(node.value, None)]
+    if not isinstance(node, ast.JoinedStr):
+        return []
+    # Whether an f-string is SQL at all shows in its leading literal
+    head = node.values[0] if node.values else None
+    if isinstance(head, ast.Constant) and SQL_START.match(head.value.lstrip()):
+        return render(rel, node)
+    return []
+
+
+def sql_strings(path, rel):
+    """Yield (line, sql, error) for each SQL string literal in a module."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    # Literal fragments of f-strings are handled with their f-string, and
+    # docstrings are prose even when they start with "Delete ..."
+    skip = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.JoinedStr):
+            skip.update(id(v) for v in node.values)
+        elif isinstance(node, ast.Expr):
+            skip.add(id(node.value))
+    for node in ast.walk(tree):
+        if id(node) in skip:
+            continue
+        for text, error in string_renderings(rel, node):
+            if error or SQL_START.match(text.strip()):
+                yield node.lineno, text and text.strip(), error
+
+
+def catalog_queries():
+    """Representative keyset listing queries for every sort and filter."""
+    from src.api.cars import CAR_SORTS, car_filters
+    from src.api.spots import SPOT_SORTS, spot_filters
+    from src.pagination import build_page_query, encode_cursor
+
+    car_cases = [
+        {},
+        {"min_price": 1, "max_price": 2},
+        {"seats": 7},
+        {"min_seats": 5},
+        {"transmission": "manual"},
+        {"fuel_type": "diesel"},
+    ]
+    spot_cases = [{}, {"min_price": 1, "max_price": 2}, {"location": "goa"}]
+    for table, sorts, filters, cases in (
+        ("cars", CAR_SORTS, car_filters, car_cases),
+        ("picnic_spots", SPOT_SORTS, spot_filters, spot_cases),
+    ):
+        for (sort, order), case, paged in itertools.product(
+            sorts.items(), cases, (False, True)
+        ):
+            where, params = filters(**case)
+            cursor = encode_cursor(sort, 1, 1) if paged else None
+            sql, _ = build_page_query(table, where, params, sort, order, 50, cursor)
+            label = f"{table} sort={sort} {case or ''}{' +cursor' if paged else ''}"
+            yield label, sql
+
+
+def full_scans(plan):
+    """
+    Problems with the plan on large tables: each one it reads in full (with
+    or without walking an index) and each temporary b-tree sort of them.
+    """
+    problems, large = [], []
+    for row in plan:
+        detail = row[3]
+        parts = detail.split()
+        if parts[0] in ("SCAN", "SEARCH") and len(parts) >= 2 and is_large(parts[1]):
+            large.append(parts[1])
+            if parts[0] == "SCAN":
+                problems.append(f"full scan of {parts[1]}")
+        elif detail.startswith("USE TEMP B-TREE") and large:
+            problems.append(f"{detail.lower()} on {', '.join(large)}")
+    return problems
+
+
+def explain(conn, sql):
+    return conn.execute("EXPLAIN QUERY PLAN " + sql, [None] * sql.count("?")).fetchall()
+
+
+def build_database():
+    """
+    A throwaway database built the way a fresh install is: init_db() on
+    import, then the migration script. Returns a connection, or None.
+    """
+    workdir = tempfile.mkdtemp(prefix="rental-plans-")
+    sys.path.insert(0, ROOT)
+    os.chdir(workdir)
+    import src.db_ops  # runs init_db
+    from migrate_database import migrate_database
+    from src.chat_archive import ensure_partition
+
+    if not migrate_database(os.path.join(workdir, "rental.db")):
+        return None
+    # The migration rebuilds some tables; indexes come back on the next start
+    src.db_ops.init_db()
+    ensure_partition(src.db_ops.db, PARTITION_MONTH)
+    return sqlite3.connect(os.path.join(workdir, "rental.db"))
+
+
+def collect_checks():
+    """(label, sql, error) for every query in the source and the listings."""
+    checks = []
+    paths = glob.glob(os.path.join(ROOT, "src", "*.py"))
+    paths += glob.glob(os.path.join(ROOT, "src", "api", "*.py"))
+    for path in sorted(paths):
+        rel = os.path.relpath(path, ROOT).replace(os.sep, "/")
+        for line, sql, error in sql_strings(path, rel):
+            checks.append((f"{rel}:{line}", sql, error))
+    for label, sql in catalog_queries():
+        checks.append((label, sql, None))
+    return checks
+
+
+def check(conn, sql):
+    """(problems, plan) of one query; problems are empty when it passes."""
+    try:
+        plan = explain(conn, sql)
+    except sqlite3.Error as e:
+        return [str(e)], []
+    problems = full_scans(plan)
+    if FULL_SCAN_MARKER in sql:
+        return [], plan
+    return problems, plan
+
+
+def report(label, sql, problems, plan, verbose):
+    if problems:
+        print(f"FAIL {label}: {'; '.join(problems)}")
+        if sql:
+            print(f"     {' '.join(sql.split())}")
+    elif verbose:
+        expected = full_scans(plan)
+        print(
+            f"OK   {label}"
+            + (f": {'; '.join(expected)} (expected)" if expected else "")
+        )
+    if problems or verbose:
+        for row in plan:
+            print(f"     {row[3]}")
+
+
+def main():
+    verbose = "-v" in sys.argv[1:]
+    conn = build_database()
+    if conn is None:
+        return 1
+    checks = collect_checks()
+    failures = 0
+    print()
+    for label, sql, error in checks:
+        if error:
+            problems, plan = [error], []
+        else:
+            problems, plan = check(conn, sql)
+        report(label, sql, problems, plan, verbose)
+        failures += bool(problems)
+
+    print(f"\n{len(checks)} queries checked, {failures} failing")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
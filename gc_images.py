@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Image Garbage Collection
+Deletes uploaded images that no car, picnic spot or last trip references
+any more, and temp files left behind by interrupted uploads. Files younger
+than the grace period are kept so an upload whose row hasn't been saved yet
+survives; a re-upload of the same image restarts its grace period.
+
+Only content-addressed uploads are considered unless --include-legacy is
+given, which also collects the timestamp-named files written by older
+versions (hand-placed images are never touched).
+
+Usage: python gc_images.py [--dry-run] [--include-legacy] [min_age_hours]
+"""
+import sys
+
+from src.db_ops import db
+from src.uploads import referenced_images, upload_store
+from src.utils import config
+
+
+def format_size(size):
+    if size < 1024:
+        return f"{size} B"
+    for unit in ("KB", "MB"):
+        size /= 1024
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+    return f"{size / 1024:.1f} GB"
+
+
+def main():
+    args = sys.argv[1:]
+    dry_run = "--dry-run" in args
+    include_legacy = "--include-legacy" in args
+    positional = [a for a in args if not a.startswith("--")]
+    min_age_hours = (
+        float(positional[0]) if positional else config.UPLOAD_GC_MIN_AGE_HOURS
+    )
+
+    referenced = referenced_images(db)
+    removed, freed = upload_store.collect_garbage(
+        referenced,
+        min_age_seconds=min_age_hours * 3600,
+        include_legacy=include_legacy,
+        dry_run=dry_run,
+    )
+    for path, size in removed:
+        print(
+            f"{'would remove' if dry_run else 'removed'} {path} ({format_size(size)})"
+        )
+    verb = "Would free" if dry_run else "Freed"
+    print(
+        f"\n{verb} {format_size(freed)} in {len(removed)} files "
+        f"({len(referenced)} paths referenced, grace period {min_age_hours:g}h)"
+    )
+
+
+if __name__ == "__main__":
+    main()
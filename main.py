@@ -1,20 +1,70 @@
-from fastapi import FastAPI, HTTPException, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import List, Optional
+import asyncio
 import json
 from datetime import datetime
-from src.db_ops import db, verify_admin
+from src.db_ops import async_db, db, verify_admin
+from src.admin_auth import issue_admin_token
 from src.utils import create_folders, config
+from src.sessions import session_sweeper
+from src.uploads import UploadLimitMiddleware
+from src.images import variant_worker
+from src.compression import CompressionMiddleware
+from src.rate_limit import RateLimitMiddleware, rate_limiter
+from src.search import catalog_index
+from src.chat_history import chat_log_writer
+from src.static import (
+    REVALIDATE,
+    CachedStaticFiles,
+    StaticAssets,
+    image_cache_control,
+)
 
 # Create necessary folders
 create_folders()
 
-app = FastAPI()
 
-# CORS middleware
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background maintenance tasks run for the lifetime of the server
+    tasks = [asyncio.create_task(session_sweeper())]
+    chat_log_writer.start()
+    # Retrieval index the chatbot answers from; kept current by admin writes
+    count = await async_db.run(catalog_index.build, async_db.sync)
+    print(f"Catalog index: {count} documents")
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Write chat log rows still queued before the process exits
+    await chat_log_writer.stop()
+    variant_worker.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Reject oversized uploads before their body is spooled to disk
+app.add_middleware(
+    UploadLimitMiddleware,
+    path_prefix="/api/admin/upload/",
+    max_bytes=int(config.UPLOAD_MAX_REQUEST_MB * 1024 * 1024),
+)
+
+# Token buckets on public write endpoints, checked before the route runs
+if config.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=rate_limiter,
+        trust_proxy=config.RATE_LIMIT_TRUST_PROXY,
+    )
+
+# gzip/brotli for larger responses not already compressed by the caches
+app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MIN_BYTES)
+
+# CORS middleware (added last so it also wraps early 413 and 429 responses)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -23,10 +73,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files
-app.mount("/images", StaticFiles(directory="images"), name="images")
-# Serve public static files under /public to avoid shadowing API routes
-app.mount("/public", StaticFiles(directory="public", html=True), name="public")
+# Mount static files. Content-addressed uploads never change and are cached
+# for good; everything else revalidates with ETag/Last-Modified.
+app.mount(
+    "/images",
+    CachedStaticFiles(directory="images", cache_control=image_cache_control),
+    name="images",
+)
+# Serve public static files under /public to avoid shadowing API routes.
+# Pages reference the fingerprinted /static URLs instead.
+app.mount(
+    "/public",
+    CachedStaticFiles(
+        directory="public", html=True, cache_control=lambda name: REVALIDATE
+    ),
+    name="public",
+)
+
+# Fingerprinted JS/CSS and prerendered pages, built once at startup
+static_assets = StaticAssets("public", auto_reload=config.STATIC_AUTO_RELOAD)
+static_assets.load()
+
+
+@app.get("/static/{filename}", include_in_schema=False)
+async def serve_static(filename: str, request: Request):
+    return static_assets.asset(request, filename)
+
 
 # Database operations are provided by src.db_ops.Database (imported as db)
 
@@ -48,63 +120,63 @@ app.include_router(admin_router)
 
 # Serve HTML pages explicitly
 @app.get("/", include_in_schema=False)
-async def serve_index():
-    return FileResponse("public/index.html")
+async def serve_index(request: Request):
+    return static_assets.page(request, "index.html")
 
 
 @app.get("/spots.html", include_in_schema=False)
-async def serve_spots():
-    return FileResponse("public/spots.html")
+async def serve_spots(request: Request):
+    return static_assets.page(request, "spots.html")
 
 
 @app.get("/spot-detail.html", include_in_schema=False)
-async def serve_spot_detail():
-    return FileResponse("public/spot-detail.html")
+async def serve_spot_detail(request: Request):
+    return static_assets.page(request, "spot-detail.html")
 
 
 @app.get("/car-detail.html", include_in_schema=False)
-async def serve_car_detail():
-    return FileResponse("public/car-detail.html")
+async def serve_car_detail(request: Request):
+    return static_assets.page(request, "car-detail.html")
 
 
 @app.get("/cars.html", include_in_schema=False)
-async def serve_cars():
-    return FileResponse("public/cars.html")
+async def serve_cars(request: Request):
+    return static_assets.page(request, "cars.html")
 
 
 @app.get("/last-trips.html", include_in_schema=False)
-async def serve_last_trips():
-    return FileResponse("public/last-trips.html")
+async def serve_last_trips(request: Request):
+    return static_assets.page(request, "last-trips.html")
 
 
 @app.get("/last-trip-detail.html", include_in_schema=False)
-async def serve_last_trip_detail():
-    return FileResponse("public/last-trip-detail.html")
+async def serve_last_trip_detail(request: Request):
+    return static_assets.page(request, "last-trip-detail.html")
 
 
 @app.get("/login.html", include_in_schema=False)
-async def serve_login():
-    return FileResponse("public/login.html")
+async def serve_login(request: Request):
+    return static_assets.page(request, "login.html")
 
 
 @app.get("/register.html", include_in_schema=False)
-async def serve_register():
-    return FileResponse("public/register.html")
+async def serve_register(request: Request):
+    return static_assets.page(request, "register.html")
 
 
 @app.get("/admin.html", include_in_schema=False)
-async def serve_admin():
-    return FileResponse("public/admin.html")
+async def serve_admin(request: Request):
+    return static_assets.page(request, "admin.html")
 
 
 @app.get("/index.html", include_in_schema=False)
-async def serve_admin():
-    return FileResponse("public/index.html")
+async def serve_admin(request: Request):
+    return static_assets.page(request, "index.html")
 
 
 @app.get("/admin", include_in_schema=False)
-async def serve_admin():
-    return FileResponse("public/admin.html")
+async def serve_admin(request: Request):
+    return static_assets.page(request, "admin.html")
 
 
 # Admin authentication
@@ -114,9 +186,15 @@ class AdminLogin(BaseModel):
 
 
 @app.post("/api/admin/login", tags=["admin"])
-def admin_login(admin: AdminLogin):
-    if verify_admin(admin.username, admin.password):
-        return {"message": "Login successful", "token": "dummy_token"}
+async def admin_login(admin: AdminLogin):
+    if await verify_admin(admin.username, admin.password):
+        token, expires_at = issue_admin_token(admin.username)
+        return {
+            "message": "Login successful",
+            "token": token,
+            "token_type": "bearer",
+            "expires_at": expires_at,
+        }
     raise HTTPException(status_code=401, detail="Invalid credentials")
 
 
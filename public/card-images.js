@@ -0,0 +1,10 @@
+// Card images - <img> attributes for a catalog card. Uses the card-sized
+// variant (with srcset) when the API lists one for the path, else the
+// original upload. Uses the page's API_URL.
+
+function cardImageAttrs(item, p) {
+  const v = (item.image_variants || {})[p];
+  if (!v) return `src="${API_URL}${p}"`;
+  const srcset = v.srcset.split(', ').map(s => API_URL + s).join(', ');
+  return `src="${API_URL}${v.card}" srcset="${srcset}" sizes="(max-width: 600px) 100vw, 480px" loading="lazy"`;
+}
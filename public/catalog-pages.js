@@ -0,0 +1,45 @@
+// Catalog paging - /api/cars and /api/spots answer one page at a time as
+// { <key>: [...], next_cursor }, with next_cursor null on the last page.
+// Uses the page's API_URL.
+
+async function fetchCatalogPage(path, key, cursor) {
+  const res = await fetch(`${API_URL}${path}` + (cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''));
+  if (!res.ok) throw new Error(`${path} answered ${res.status}`);
+  const data = await res.json();
+  return { items: data[key] || [], cursor: data.next_cursor || null };
+}
+
+// Every page in turn; for admin tables, not for public listings
+async function fetchAllCatalogPages(path, key) {
+  let items = [], cursor = null;
+  do {
+    const page = await fetchCatalogPage(path, key, cursor);
+    items = items.concat(page.items);
+    cursor = page.cursor;
+  } while (cursor);
+  return items;
+}
+
+// A listing that starts with the first page and adds the next one each
+// time button is clicked; render gets every item loaded so far. The
+// button is hidden once there are no more pages. Returns the function
+// loading the next page (call it once for the first).
+function catalogPager(path, key, button, render) {
+  let items = [], cursor = null;
+  const label = button.textContent;
+  async function loadMore() {
+    button.disabled = true;
+    try {
+      const page = await fetchCatalogPage(path, key, cursor);
+      items = items.concat(page.items);
+      cursor = page.cursor;
+      render(items);
+      button.textContent = label;
+    } finally {
+      button.disabled = false;
+      button.style.display = cursor ? '' : 'none';
+    }
+  }
+  button.addEventListener('click', () => loadMore().catch(() => { button.textContent = 'Failed to load, try again'; }));
+  return loadMore;
+}
@@ -74,6 +74,7 @@
     wrap.appendChild(bub);
     bodyEl.appendChild(wrap);
     bodyEl.scrollTop = bodyEl.scrollHeight;
+    return bub;
   }
 
   // Planner workflow
@@ -150,15 +151,65 @@
       return;
     }
 
+    const payload = { session_id: getSessionId(), message: text };
+    const t = getToken(); if(t) payload.token = t;
+    try{
+      if(window.ReadableStream && window.TextDecoder){
+        await streamReply(payload);
+        return;
+      }
+    }catch(e){
+      // Part of the reply already shown: keep it rather than asking again
+      if(e.partial) return;
+    }
     try{
-      const payload = { session_id: getSessionId(), message: text };
-      const t = getToken(); if(t) payload.token = t;
       const res = await fetch(`${API_URL}/api/chat`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) });
+      if(res.status === 429){ appendMsg(slowDownMessage(res), 'assistant'); return; }
       const data = await res.json();
       appendMsg(data.reply || 'Thanks! We will get back to you.', 'assistant');
     }catch(e){ appendMsg('Network error. Please try again.', 'assistant'); }
   }
 
+  function slowDownMessage(res){
+    const wait = parseInt(res.headers.get('Retry-After') || '', 10);
+    return `You're sending messages quickly. Please try again${wait ? ` in ${wait}s` : ' shortly'}.`;
+  }
+
+  // Reply as server-sent events: {"delta"} chunks, then a "done" event
+  async function streamReply(payload){
+    const res = await fetch(`${API_URL}/api/chat/stream`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) });
+    if(res.status === 429){ appendMsg(slowDownMessage(res), 'assistant'); return; }
+    if(!res.ok || !res.body) throw new Error('stream unavailable');
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let bub = null;
+    let text = '';
+    try{
+      while(true){
+        const { value, done } = await reader.read();
+        if(done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while((sep = buffer.indexOf('\n\n')) !== -1){
+          const block = buffer.slice(0, sep);
+          buffer = buffer.slice(sep + 2);
+          const data = block.split('\n').filter(l => l.startsWith('data: ')).map(l => l.slice(6)).join('\n');
+          if(!data) continue;
+          const msg = JSON.parse(data);
+          if(msg.delta){
+            text += msg.delta;
+            if(!bub){ bub = appendMsg(text, 'assistant'); } else { bub.innerText = text; bodyEl.scrollTop = bodyEl.scrollHeight; }
+          }
+        }
+      }
+    }catch(e){
+      if(bub){ e.partial = true; }
+      throw e;
+    }
+    if(!bub) appendMsg('Thanks! We will get back to you.', 'assistant');
+  }
+
   toggle.addEventListener('click', ()=>{
     const visible = panel.style.display === 'flex';
     panel.style.display = visible ? 'none' : 'flex';
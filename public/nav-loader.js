@@ -4,6 +4,12 @@
   
   // Load navigation HTML
   async function loadNavigation() {
+    // Pages served by the app already have the nav inlined
+    const existing = document.getElementById('nav-placeholder');
+    if (existing && existing.children.length) {
+      initializeMenuToggle();
+      return;
+    }
     try {
       const response = await fetch('/public/nav.html');
       const navHTML = await response.text();
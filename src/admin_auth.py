@@ -0,0 +1,105 @@
+# PI: AdminAuth - signed, expiring admin tokens and the require_admin dependency
+from typing import Optional, Tuple
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+
+from fastapi import HTTPException, Request
+
+from src.db_ops import verify_admin
+from src.utils import config
+
+if config.ADMIN_TOKEN_SECRET:
+    _SECRET = config.ADMIN_TOKEN_SECRET.encode("utf-8")
+else:
+    # Tokens then only verify in this process and die with it
+    _SECRET = secrets.token_bytes(32)
+    print(
+        "ADMIN_TOKEN_SECRET is not set; admin tokens will not survive a restart "
+        "or work across worker processes"
+    )
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(
+        hmac.new(_SECRET, payload.encode("ascii"), hashlib.sha256).digest()
+    )
+
+
+def issue_admin_token(username: str) -> Tuple[str, int]:
+    """Return (token, expires_at unix timestamp) for an authenticated admin."""
+    expires_at = int(time.time() + config.ADMIN_TOKEN_TTL_MINUTES * 60)
+    payload = _b64encode(
+        json.dumps({"sub": username, "exp": expires_at}, separators=(",", ":")).encode(
+            "utf-8"
+        )
+    )
+    return f"{payload}.{_sign(payload)}", expires_at
+
+
+def verify_admin_token(token: str) -> Optional[str]:
+    """Admin username for a valid, unexpired token; None otherwise."""
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+        if claims["exp"] <= time.time():
+            return None
+        return claims["sub"]
+    except (ValueError, KeyError, TypeError, UnicodeError):
+        return None
+
+
+async def _legacy_credentials(request: Request) -> Tuple[Optional[str], Optional[str]]:
+    """username/password sent the pre-token way: form fields or JSON body."""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data") or content_type.startswith(
+        "application/x-www-form-urlencoded"
+    ):
+        form = await request.form()
+        return form.get("username"), form.get("password")
+    try:
+        body = await request.json()
+    except ValueError:
+        return None, None
+    if not isinstance(body, dict):
+        return None, None
+    # Catalog routes nest them under "admin"; the stats routes send them bare
+    creds = body.get("admin") if isinstance(body.get("admin"), dict) else body
+    return creds.get("username"), creds.get("password")
+
+
+async def require_admin(request: Request) -> str:
+    """
+    FastAPI dependency returning the authenticated admin's username.
+
+    Accepts "Authorization: Bearer <token>" from /api/admin/login, checked
+    without touching the database. While ADMIN_LEGACY_CREDENTIALS is on,
+    requests without a token may still send username/password in the body.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        username = verify_admin_token(token.strip())
+        if username:
+            return username
+    elif config.ADMIN_LEGACY_CREDENTIALS:
+        username, password = await _legacy_credentials(request)
+        if username and password and await verify_admin(username, password):
+            return username
+    raise HTTPException(
+        status_code=401,
+        detail="Unauthorized",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
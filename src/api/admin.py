@@ -1,11 +1,16 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from src.db_ops import Database
+from typing import Optional
+from src.db_ops import async_db as db
+from src.admin_auth import require_admin
+from src.cache import catalog_cache
+from src.chat_history import chat_history, chat_log_writer
+from src.llm import chat_model, reply_cache
+from src.rate_limit import rate_limiter
+from src.sessions import session_cache
 
 router = APIRouter(tags=["admin"])  # ensure endpoints appear under admin section/tag
 
-db = Database()
-
 
 class AdminAuthorizer(BaseModel):
     username: str
@@ -18,23 +23,17 @@ class NewAdmin(BaseModel):
 
 
 class CreateAdminPayload(BaseModel):
-    admin: AdminAuthorizer  # authorizing admin (must be a different admin)
+    # Legacy body credentials of the authorizing admin; unused with a bearer token
+    admin: Optional[AdminAuthorizer] = None
     new_admin: NewAdmin  # credentials for the new admin to be created
 
 
 @router.post("/api/admin/users")
-def create_admin(payload: CreateAdminPayload):
-    # Validate authorizer by admin username and password
-    auth = payload.admin
-    auth_row = db.fetchone(
-        "SELECT id, username FROM admin WHERE username = ? AND password = ?",
-        (auth.username, auth.password),
-    )
-    if not auth_row:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
+async def create_admin(
+    payload: CreateAdminPayload, admin: str = Depends(require_admin)
+):
     # Ensure username is unique
-    existing = db.fetchone(
+    existing = await db.fetchone(
         "SELECT id FROM admin WHERE username = ?", (payload.new_admin.username,)
     )
     if existing:
@@ -43,7 +42,7 @@ def create_admin(payload: CreateAdminPayload):
         )
 
     # Create new admin
-    db.insert(
+    await db.insert(
         "INSERT INTO admin (username, password) VALUES (?, ?)",
         (payload.new_admin.username, payload.new_admin.password),
     )
@@ -51,36 +50,61 @@ def create_admin(payload: CreateAdminPayload):
 
 
 class ChangePasswordPayload(BaseModel):
-    admin: AdminAuthorizer  # authorizing admin (must be different from target admin)
+    # Legacy body credentials of the authorizing admin (must differ from target)
+    admin: Optional[AdminAuthorizer] = None
     new_password: str
 
 
 @router.put("/api/admin/users/{username}/password")
-def change_admin_password(username: str, payload: ChangePasswordPayload):
-    # Validate authorizer by admin username and password
-    auth = payload.admin
-    auth_row = db.fetchone(
-        "SELECT id, username FROM admin WHERE username = ? AND password = ?",
-        (auth.username, auth.password),
-    )
-    if not auth_row:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
+async def change_admin_password(
+    username: str, payload: ChangePasswordPayload, admin: str = Depends(require_admin)
+):
     # Ensure target admin exists
-    target_row = db.fetchone("SELECT id FROM admin WHERE username = ?", (username,))
+    target_row = await db.fetchone(
+        "SELECT id FROM admin WHERE username = ?", (username,)
+    )
     if not target_row:
         raise HTTPException(status_code=404, detail="Admin not found")
 
     # Enforce that another admin authorizes the change (not self)
-    if auth.username == username:
+    if admin == username:
         raise HTTPException(
             status_code=403,
             detail="Password change must be authorized by a different admin",
         )
 
     # Perform password update
-    db.execute(
+    await db.execute(
         "UPDATE admin SET password = ? WHERE username = ?",
         (payload.new_password, username),
     )
     return {"message": "Password updated successfully"}
+
+
+@router.post("/api/admin/db/stats")
+async def db_stats(admin: str = Depends(require_admin)):
+    return {
+        "pool": db.sync.pool_stats(),
+        "pragmas": await db.run(db.sync.effective_pragmas),
+    }
+
+
+@router.post("/api/admin/cache/stats")
+async def cache_stats(admin: str = Depends(require_admin)):
+    return {"catalog": catalog_cache.stats(), "sessions": session_cache.stats()}
+
+
+@router.post("/api/admin/chat/stats")
+async def chat_stats(admin: str = Depends(require_admin)):
+    return {
+        "model": chat_model.available,
+        "limiter": chat_model.limiter.stats(),
+        "reply_cache": reply_cache.stats(),
+        "history": chat_history.stats(),
+        "log_writer": chat_log_writer.stats(),
+    }
+
+
+@router.post("/api/admin/rate-limit/stats")
+async def rate_limit_stats(admin: str = Depends(require_admin)):
+    return rate_limiter.stats()
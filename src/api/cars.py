@@ -1,70 +1,129 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from typing import List
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Request, Query
+from typing import Any, List, Optional, Tuple
 import json
-import os
-import shutil
-import re
-from datetime import datetime
 from src.schemas import Car, CarUpdate
-from src.db_ops import Database, verify_admin
+from src.db_ops import async_db as db
+from src.admin_auth import require_admin
+from src.uploads import row_images, upload_store
+from src.cache import cached_json, catalog_cache
+from src.images import with_variants
+from src.pagination import fetch_page
+from src.utils import config
 
 router = APIRouter(tags=["cars"])
 
-db = Database()
+# sort key -> (column, descending)
+CAR_SORTS = {
+    "id": ("id", False),
+    "newest": ("id", True),
+    "price_asc": ("price_per_day", False),
+    "price_desc": ("price_per_day", True),
+    "seats_asc": ("seats", False),
+    "seats_desc": ("seats", True),
+}
 
 
 @router.post("/api/admin/upload/car")
 async def upload_car_images(
     files: List[UploadFile] = File(...),
-    username: str = Form(...),
-    password: str = Form(...),
+    admin: str = Depends(require_admin),
 ):
-    if not verify_admin(username, password):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
-    os.makedirs(os.path.join("images", "cars"), exist_ok=True)
-    saved_paths = []
-    for file in files:
-        original = file.filename or "upload"
-        base, ext = os.path.splitext(original)
-        safe_base = re.sub(r"[^A-Za-z0-9_-]+", "_", base) or "image"
-        unique_suffix = datetime.now().strftime("%Y%m%d%H%M%S%f")
-        new_name = f"{safe_base}_{unique_suffix}{ext}"
-        dest_path = os.path.join("images", "cars", new_name)
-        with open(dest_path, "wb") as out:
-            shutil.copyfileobj(file.file, out)
-        saved_paths.append(f"/images/cars/{new_name}")
-        file.file.close()
-
-    return {"paths": saved_paths}
+    stored = await upload_store.save(files, "cars")
+    return {
+        "paths": [f.path for f in stored],
+        "files": [f._asdict() for f in stored],
+    }
 
 
 @router.get("/api/cars")
-def get_cars():
-    result = db.fetchall_dicts("SELECT * FROM cars WHERE available = 1")
-    return {"cars": result}
+async def get_cars(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=config.CATALOG_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    seats: Optional[int] = None,
+    min_seats: Optional[int] = None,
+    transmission: Optional[str] = None,
+    fuel_type: Optional[str] = None,
+    sort: str = "id",
+):
+    if sort not in CAR_SORTS:
+        raise HTTPException(
+            status_code=400, detail=f"sort must be one of {', '.join(CAR_SORTS)}"
+        )
+    limit = limit or config.CATALOG_PAGE_SIZE
+    where, params = car_filters(
+        min_price, max_price, seats, min_seats, transmission, fuel_type
+    )
+
+    async def load():
+        cars, next_cursor = await fetch_page(
+            db, "cars", where, params, sort, CAR_SORTS[sort], limit, cursor
+        )
+        return {
+            "cars": await with_variants(cars, "cars"),
+            "next_cursor": next_cursor,
+        }
+
+    key = ("list", sort, limit, cursor, tuple(where), tuple(params))
+    return (await cached_json("cars", key, load)).response(request)
+
+
+def car_filters(
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    seats: Optional[int] = None,
+    min_seats: Optional[int] = None,
+    transmission: Optional[str] = None,
+    fuel_type: Optional[str] = None,
+) -> Tuple[List[str], List[Any]]:
+    """WHERE clauses and parameters for the public car listing."""
+    where = ["available = 1"]
+    params = []
+    if min_price is not None:
+        where.append("price_per_day >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        where.append("price_per_day <= ?")
+        params.append(max_price)
+    if seats is not None:
+        where.append("seats = ?")
+        params.append(seats)
+    if min_seats is not None:
+        where.append("seats >= ?")
+        params.append(min_seats)
+    if transmission:
+        where.append("transmission = ? COLLATE NOCASE")
+        params.append(transmission)
+    if fuel_type:
+        where.append("fuel_type = ? COLLATE NOCASE")
+        params.append(fuel_type)
+    return where, params
 
 
 @router.get("/api/cars/{car_id}")
-def get_car(car_id: int):
-    car = db.fetchone_dict("SELECT * FROM cars WHERE id = ?", (car_id,))
+async def get_car(car_id: int, request: Request):
+    async def load():
+        car = await db.fetchone_dict(
+            "SELECT * FROM cars WHERE id = ?", (car_id,), table="cars"
+        )
+        return await with_variants(car, "cars")
+
+    car = await cached_json("cars", ("detail", car_id), load, row_id=car_id)
     if not car:
         raise HTTPException(status_code=404, detail="Car not found")
-    return car
+    return car.response(request)
 
 
 @router.post("/api/admin/cars")
-def add_car(payload: dict):
+async def add_car(payload: dict, admin: str = Depends(require_admin)):
     # Expect payload to contain 'car' and 'admin' keys
     car = payload.get("car")
-    admin = payload.get("admin")
-
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
 
     car_obj = Car(**car)
 
-    car_id = db.insert(
+    car_id = await db.insert(
         """
         INSERT INTO cars (name, model, price_per_day, seats, transmission, fuel_type, images, description, available)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -81,18 +140,15 @@ def add_car(payload: dict):
             car_obj.available,
         ),
     )
+    catalog_cache.invalidate("cars", car_id)
 
     return {"message": "Car added successfully", "id": car_id}
 
 
 @router.put("/api/admin/cars/{car_id}")
-def update_car(car_id: int, payload: dict):
-    admin = payload.get("admin")
+async def update_car(car_id: int, payload: dict, admin: str = Depends(require_admin)):
     car = payload.get("car")
 
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
     car_update = CarUpdate(**car)
 
     update_fields = []
@@ -132,17 +188,21 @@ def update_car(car_id: int, payload: dict):
     values.append(car_id)
     query = f"UPDATE cars SET {', '.join(update_fields)} WHERE id = ?"
 
-    db.execute(query, values)
+    replaced = (
+        await row_images(db, "cars", car_id) if car_update.images is not None else []
+    )
+    await db.execute(query, values)
+    catalog_cache.invalidate("cars", car_id)
+    await upload_store.release(db, replaced)
 
     return {"message": "Car updated successfully"}
 
 
 @router.delete("/api/admin/cars/{car_id}")
-def delete_car(car_id: int, payload: dict):
-    admin = payload.get("admin")
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
-    db.execute("DELETE FROM cars WHERE id = ?", (car_id,))
+async def delete_car(car_id: int, admin: str = Depends(require_admin)):
+    images = await row_images(db, "cars", car_id)
+    await db.execute("DELETE FROM cars WHERE id = ?", (car_id,))
+    catalog_cache.invalidate("cars", car_id)
+    await upload_store.release(db, images)
 
     return {"message": "Car deleted successfully"}
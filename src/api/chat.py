@@ -1,27 +1,28 @@
 # PI: Chatbot - OpenAI-backed chatbot API with session tracking and planner endpoint
-import os
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, List
-from src.db_ops import Database
+from typing import AsyncIterator, Optional, List
+import time
+from src.cache import dumps
+from src.chat_history import FIELDS, chat_history, chat_log_writer
+from src.llm import ChatSaturated, chat_model, reply_cache
+from src.search import (
+    catalog_index,
+    describe,
+    is_car_query,
+    parse_car_filters,
+    retrieve,
+)
+from src.sessions import resolve_session
 from src.utils import config
 
-# Optional OpenAI integration
-OPENAI_API_KEY = config.OPENAI_API_KEY
-client = None
-try:
-    if OPENAI_API_KEY:
-        from openai import OpenAI
-
-        client = OpenAI(api_key=OPENAI_API_KEY)
-except Exception:
-    client = None
+# Longest assistant reply kept and logged
+MAX_REPLY_CHARS = 1200
 
 router = APIRouter(tags=["chatbot"])
 
-db = Database()
-
 
 class ChatRequest(BaseModel):
     session_id: str
@@ -42,74 +43,101 @@ class TripPlan(BaseModel):
     token: Optional[str] = None
 
 
+async def log_message(
+    session_id: str, user_email: Optional[str], role: str, message: str
+) -> None:
+    row = (session_id, user_email, role, message, datetime.utcnow().isoformat())
+    # Committed now or queued for the next batch, per CHAT_LOG_DURABILITY
+    await chat_log_writer.write(row)
+    chat_history.append(dict(zip(FIELDS, row)))
+
+
 @router.post("/api/chat")
-def chat(req: ChatRequest):
-    user_email = None
-    if req.token:
-        sess = db.fetchone(
-            "SELECT user_email FROM sessions WHERE token = ?", (req.token,)
-        )
-        if sess:
-            user_email = sess[0] if isinstance(sess, tuple) else sess["user_email"]
+async def chat(req: ChatRequest):
+    user = await resolve_session(req.token)
+    user_email = user["email"] if user else None
 
     # Log user message
-    db.insert(
-        """
-        INSERT INTO chat_logs (session_id, user_email, role, message, created_at)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-        (
-            req.session_id,
-            user_email,
-            "user",
-            req.message,
-            datetime.utcnow().isoformat(),
-        ),
-    )
+    await log_message(req.session_id, user_email, "user", req.message)
 
     # Generate reply using OpenAI if configured, otherwise fallback
     reply_text = (
-        generate_ai_reply(req.session_id, req.message)
-        if client
+        await generate_ai_reply(req.session_id, req.message)
+        if chat_model.available
         else generate_reply(req.message)
     )
 
     # Log assistant reply
-    db.insert(
-        """
-        INSERT INTO chat_logs (session_id, user_email, role, message, created_at)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-        (
-            req.session_id,
-            user_email,
-            "assistant",
-            reply_text,
-            datetime.utcnow().isoformat(),
-        ),
-    )
+    await log_message(req.session_id, user_email, "assistant", reply_text)
 
     return {"reply": reply_text, "user_email": user_email}
 
 
-@router.get("/api/chat/history")
-def history(session_id: str, limit: int = 50):
-    rows = db.fetchall_dicts(
-        "SELECT session_id, user_email, role, message, created_at FROM chat_logs WHERE session_id = ? ORDER BY id DESC LIMIT ?",
-        (session_id, limit),
+def sse_event(data: dict, event: Optional[str] = None) -> bytes:
+    prefix = f"event: {event}\n".encode("utf-8") if event else b""
+    return prefix + b"data: " + dumps(data) + b"\n\n"
+
+
+@router.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Same as /api/chat, but the reply arrives as server-sent events: a
+    {"delta": text} event per chunk, then a "done" event with the full reply.
+    When the model is unavailable or busy the canned reply is sent as one delta.
+    """
+    user = await resolve_session(req.token)
+    user_email = user["email"] if user else None
+    await log_message(req.session_id, user_email, "user", req.message)
+
+    async def events() -> AsyncIterator[bytes]:
+        reply = ""
+        if chat_model.available:
+            try:
+                messages = await chat_messages(req.session_id, req.message)
+                cached = reply_cache.get(messages)
+                if cached is not None:
+                    reply = cached
+                    yield sse_event({"delta": reply})
+                else:
+                    generation = reply_cache.generation
+                    started = time.monotonic()
+                    async for delta in chat_model.stream(messages):
+                        delta = delta[: MAX_REPLY_CHARS - len(reply)]
+                        if delta:
+                            reply += delta
+                            yield sse_event({"delta": delta})
+                    if reply:
+                        reply_cache.put(
+                            messages, reply, time.monotonic() - started, generation
+                        )
+            except ChatSaturated:
+                pass
+            except Exception as e:
+                print(f"Chat stream failed: {e!r}")
+        if not reply:
+            reply = generate_reply(req.message)
+            yield sse_event({"delta": reply})
+        # Not reached if the client went away mid-stream
+        await log_message(req.session_id, user_email, "assistant", reply)
+        yield sse_event({"reply": reply, "user_email": user_email}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    return {"messages": list(reversed(rows))}
+
+
+@router.get("/api/chat/history")
+async def history(session_id: str, limit: int = 50):
+    return {"messages": await chat_history.recent(session_id, limit)}
 
 
 @router.post("/api/chat/plan")
-def submit_plan(plan: TripPlan):
-    user_email = None
-    if plan.token:
-        sess = db.fetchone(
-            "SELECT user_email FROM sessions WHERE token = ?", (plan.token,)
-        )
-        if sess:
-            user_email = sess[0] if isinstance(sess, tuple) else sess["user_email"]
+async def submit_plan(plan: TripPlan):
+    user = await resolve_session(plan.token)
+    user_email = user["email"] if user else None
 
     sid = plan.session_id or f"sess_{datetime.utcnow().timestamp()}"
 
@@ -126,13 +154,7 @@ def submit_plan(plan: TripPlan):
         f"• Days: {plan.days}"
     )
 
-    db.insert(
-        """
-        INSERT INTO chat_logs (session_id, user_email, role, message, created_at)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-        (sid, user_email, "planner", summary, datetime.utcnow().isoformat()),
-    )
+    await log_message(sid, user_email, "planner", summary)
 
     # Create WhatsApp message
     whatsapp_message = (
@@ -158,53 +180,87 @@ def submit_plan(plan: TripPlan):
     }
 
 
-def generate_ai_reply(session_id: str, last_user_message: str) -> str:
-    """Call OpenAI Chat Completions with short conversation context."""
-    try:
-        # Pull last few messages from history for minimal context
-        rows = db.fetchall(
-            "SELECT role, message FROM chat_logs WHERE session_id = ? ORDER BY id DESC LIMIT 8",
-            (session_id,),
+async def chat_messages(session_id: str, last_user_message: str) -> List[dict]:
+    """System prompt, recent conversation and the new message for the model."""
+    # Last few messages for minimal context, usually from memory
+    rows = await chat_history.recent(session_id, 8)
+    history: List[dict] = []
+    for r in rows:
+        role, content = r["role"], r["message"]
+        if role not in ("user", "assistant"):
+            continue
+        history.append(
+            {
+                "role": "assistant" if role == "assistant" else "user",
+                "content": content,
+            }
         )
-        # Build messages in chronological order
-        history: List[dict] = []
-        for r in reversed(rows):
-            role = r[0] if isinstance(r, tuple) else r["role"]
-            content = r[1] if isinstance(r, tuple) else r["message"]
-            if role not in ("user", "assistant"):
-                continue
-            history.append(
-                {
-                    "role": "assistant" if role == "assistant" else "user",
-                    "content": content,
-                }
-            )
-        # System prompt to scope the assistant
-        system = {
-            "role": "system",
-            "content": (
-                "You are a helpful travel and car rental assistant for a website. "
-                "Help users choose cars and picnic destinations around India. "
-                "Be concise and friendly. Prices are in INR unless stated."
-            ),
-        }
-        messages = [system] + history + [{"role": "user", "content": last_user_message}]
-
-        resp = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=messages,
-            temperature=0.4,
-            max_tokens=300,
+    # The new message was logged before this runs; don't send it twice
+    if history and history[-1] == {"role": "user", "content": last_user_message}:
+        history.pop()
+    # System prompt to scope the assistant
+    system = {
+        "role": "system",
+        "content": (
+            "You are a helpful travel and car rental assistant for a website. "
+            "Help users choose cars and picnic destinations around India. "
+            "Be concise and friendly. Prices are in INR unless stated."
+        ),
+    }
+    # Ground the answer in the listings that match the question
+    hits = retrieve(catalog_index, last_user_message, config.CHAT_RETRIEVAL_TOP_K)
+    if hits:
+        system["content"] += (
+            "\n\nCatalog listings matching the question (recommend from these "
+            "and link them; don't invent others):\n"
+            + "\n".join(f"- {describe(hit)}" for hit in hits)
         )
-        return (resp.choices[0].message.content or "")[:1200] if resp.choices else ""
-    except Exception:
+    return [system] + history + [{"role": "user", "content": last_user_message}]
+
+
+async def generate_ai_reply(session_id: str, last_user_message: str) -> str:
+    """Call OpenAI Chat Completions with short conversation context."""
+    try:
+        messages = await chat_messages(session_id, last_user_message)
+        # Repeated questions are answered without calling the model
+        cached = reply_cache.get(messages)
+        if cached is not None:
+            return cached
+        generation = reply_cache.generation
+        started = time.monotonic()
+        reply = (await chat_model.complete(messages))[:MAX_REPLY_CHARS]
+        if not reply:
+            return generate_reply(last_user_message)
+        reply_cache.put(messages, reply, time.monotonic() - started, generation)
+        return reply
+    except ChatSaturated:
         return generate_reply(last_user_message)
+    except Exception as e:
+        print(f"Chat completion failed: {e!r}")
+        return generate_reply(last_user_message)
+
+
+def catalog_reply(message: str) -> Optional[str]:
+    """Answer from the retrieval index alone, or None if nothing matches."""
+    hits = retrieve(catalog_index, message, config.CHAT_RETRIEVAL_TOP_K)
+    if not hits:
+        return None
+    if is_car_query(message) and parse_car_filters(message) and hits[0].table == "cars":
+        intro = "These cars match what you asked for, cheapest first:"
+    else:
+        intro = "Here is what I found in our catalog:"
+    return intro + "\n" + "\n".join(f"• {describe(hit)}" for hit in hits)
 
 
 def generate_reply(message: str) -> str:
     text = message.strip().lower()
-    if any(k in text for k in ["hello", "hi", "hey"]):
+    words = set(text.replace("!", " ").replace(",", " ").split())
+    if words & {"hello", "hi", "hey"} and len(words) <= 3:
         return "Hi! How can I help you with cars or picnic destinations today?"
+    # Common catalog questions are answered without the model
+    answer = catalog_reply(message)
+    if answer:
+        return answer
     if "car" in text and "price" in text:
         return "Our car prices vary by model; you can view details on the car page."
     if "spot" in text or "destination" in text:
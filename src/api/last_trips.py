@@ -1,75 +1,136 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Request, Query
+from typing import Any, Dict, List, Optional, Tuple
 import json
-import os
-import shutil
-import re
 from datetime import datetime
-from src.db_ops import Database, verify_admin
+from src.db_ops import Database, async_db as db
+from src.admin_auth import require_admin
+from src.uploads import row_images, upload_store
+from src.cache import cached_json, catalog_cache
+from src.images import with_variants
 from src.schemas import AdminLogin
+from src.utils import config
 
 router = APIRouter(tags=["last_trips"])
 
-db = Database()
+# One keyset page of a trip's comments, newest first; reads
+# idx_last_trip_comments_trip from the cursor on
+COMMENTS_PAGE_SQL = """
+    SELECT id, name, comment, created_at FROM last_trip_comments
+    WHERE trip_id = ? AND id < ? ORDER BY id DESC LIMIT ?
+"""
+
+# Larger than any comment id: the first page starts here
+FIRST_PAGE = 2**63 - 1
+
+
+async def comments_page(
+    trip_id: int, before_id: Optional[int], limit: int
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """(up to limit comments older than before_id, before_id of the next page)"""
+    rows = await db.fetchall_dicts(
+        COMMENTS_PAGE_SQL,
+        (trip_id, before_id or FIRST_PAGE, limit + 1),
+        table="last_trip_comments",
+    )
+    next_before_id = rows[limit - 1]["id"] if len(rows) > limit else None
+    return rows[:limit], next_before_id
+
+
+def insert_comment(
+    database: Database, trip_id: int, name: str, comment: str
+) -> Optional[int]:
+    """Add a comment and count it on its trip together; None if no such trip."""
+    with database.transaction() as conn:
+        cur = conn.execute(
+            "UPDATE last_trips SET comment_count = comment_count + 1 WHERE id = ?",
+            (trip_id,),
+        )
+        if not cur.rowcount:
+            return None
+        cur = conn.execute(
+            """
+            INSERT INTO last_trip_comments (trip_id, name, comment, created_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            (trip_id, name, comment, datetime.utcnow().isoformat()),
+        )
+        return cur.lastrowid
+
+
+def delete_comment(database: Database, trip_id: int, comment_id: int) -> bool:
+    """Delete a trip's comment and uncount it together; False if not found."""
+    with database.transaction() as conn:
+        cur = conn.execute(
+            "DELETE FROM last_trip_comments WHERE id = ? AND trip_id = ?",
+            (comment_id, trip_id),
+        )
+        if not cur.rowcount:
+            return False
+        conn.execute(
+            "UPDATE last_trips SET comment_count = max(comment_count - 1, 0) WHERE id = ?",
+            (trip_id,),
+        )
+        return True
 
 
 # Image upload for last trips
 @router.post("/api/admin/upload/trip")
 async def upload_trip_images(
     files: List[UploadFile] = File(...),
-    username: str = Form(...),
-    password: str = Form(...),
+    admin: str = Depends(require_admin),
 ):
-    if not verify_admin(username, password):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
-    os.makedirs(os.path.join("images", "last_trips"), exist_ok=True)
-    saved_paths = []
-    for file in files:
-        original = file.filename or "upload"
-        base, ext = os.path.splitext(original)
-        safe_base = re.sub(r"[^A-Za-z0-9_-]+", "_", base) or "image"
-        unique_suffix = datetime.now().strftime("%Y%m%d%H%M%S%f")
-        new_name = f"{safe_base}_{unique_suffix}{ext}"
-        dest_path = os.path.join("images", "last_trips", new_name)
-        with open(dest_path, "wb") as out:
-            shutil.copyfileobj(file.file, out)
-        saved_paths.append(f"/images/last_trips/{new_name}")
-        file.file.close()
-
-    return {"paths": saved_paths}
+    stored = await upload_store.save(files, "last_trips")
+    return {
+        "paths": [f.path for f in stored],
+        "files": [f._asdict() for f in stored],
+    }
 
 
 # Public endpoints
 @router.get("/api/last_trips")
-def list_last_trips():
-    rows = db.fetchall_dicts(
-        "SELECT * FROM last_trips WHERE available = 1 ORDER BY datetime(created_at) DESC"
-    )
-    return {"trips": rows}
+async def list_last_trips(request: Request):
+    async def load():
+        rows = await db.fetchall_dicts(
+            "SELECT * FROM last_trips WHERE available = 1 ORDER BY datetime(created_at) DESC",
+            table="last_trips",
+        )
+        return {"trips": await with_variants(rows, "last_trips")}
+
+    return (await cached_json("last_trips", "list", load)).response(request)
 
 
 @router.get("/api/last_trips/{trip_id}")
-def get_last_trip(trip_id: int):
-    trip = db.fetchone_dict("SELECT * FROM last_trips WHERE id = ?", (trip_id,))
+async def get_last_trip(trip_id: int, request: Request):
+    async def load():
+        trip = await db.fetchone_dict(
+            "SELECT * FROM last_trips WHERE id = ?", (trip_id,), table="last_trips"
+        )
+        if not trip:
+            return None
+        # First page only; the rest via /api/last_trips/{id}/comments
+        comments, next_before_id = await comments_page(
+            trip_id, None, config.COMMENTS_PAGE_SIZE
+        )
+        trip["comments"] = comments
+        trip["comments_next_before_id"] = next_before_id
+        return await with_variants(trip, "last_trips")
+
+    trip = await cached_json("last_trips", ("detail", trip_id), load, row_id=trip_id)
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
-    comments = db.fetchall_dicts(
-        "SELECT id, name, comment, created_at FROM last_trip_comments WHERE trip_id = ? ORDER BY id DESC",
-        (trip_id,),
-    )
-    trip["comments"] = comments
-    return trip
+    return trip.response(request)
 
 
 @router.get("/api/last_trips/{trip_id}/comments")
-def get_trip_comments(trip_id: int):
-    return {
-        "comments": db.fetchall_dicts(
-            "SELECT id, name, comment, created_at FROM last_trip_comments WHERE trip_id = ? ORDER BY id DESC",
-            (trip_id,),
-        )
-    }
+async def get_trip_comments(
+    trip_id: int,
+    before_id: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1, le=config.COMMENTS_MAX_PAGE_SIZE),
+):
+    comments, next_before_id = await comments_page(
+        trip_id, before_id, limit or config.COMMENTS_PAGE_SIZE
+    )
+    return {"comments": comments, "next_before_id": next_before_id}
 
 
 class NewComment(AdminLogin):
@@ -79,31 +140,22 @@ class NewComment(AdminLogin):
 
 
 @router.post("/api/last_trips/{trip_id}/comments")
-def add_trip_comment(trip_id: int, payload: dict):
+async def add_trip_comment(trip_id: int, payload: dict):
     name = payload.get("name") or "Guest"
     comment = payload.get("comment")
     if not comment:
         raise HTTPException(status_code=400, detail="Comment required")
-    if not db.fetchone("SELECT 1 FROM last_trips WHERE id = ?", (trip_id,)):
+    comment_id = await db.run(insert_comment, db.sync, trip_id, name, comment)
+    if comment_id is None:
         raise HTTPException(status_code=404, detail="Trip not found")
-    db.insert(
-        """
-        INSERT INTO last_trip_comments (trip_id, name, comment, created_at)
-        VALUES (?, ?, ?, ?)
-        """,
-        (trip_id, name, comment, datetime.utcnow().isoformat()),
-    )
-    return {"message": "Comment added"}
+    catalog_cache.invalidate("last_trips", trip_id, content=False)
+    return {"message": "Comment added", "id": comment_id}
 
 
 # Admin CRUD
 @router.post("/api/admin/last_trips")
-def add_last_trip(payload: dict):
-    admin = payload.get("admin")
+async def add_last_trip(payload: dict, admin: str = Depends(require_admin)):
     trip = payload.get("trip")
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
     if not trip:
         raise HTTPException(status_code=400, detail="Missing trip data")
 
@@ -119,7 +171,7 @@ def add_last_trip(payload: dict):
     images_value = trip.get("images") or []
     images_text = json.dumps(images_value)
 
-    last_id = db.insert(
+    last_id = await db.insert(
         """
         INSERT INTO last_trips (destination, spots, days, persons, images, start_date, end_date, feedback, created_at, available)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
@@ -136,16 +188,15 @@ def add_last_trip(payload: dict):
             datetime.utcnow().isoformat(),
         ),
     )
+    catalog_cache.invalidate("last_trips", last_id)
     return {"message": "Trip added", "id": last_id}
 
 
 @router.put("/api/admin/last_trips/{trip_id}")
-def update_last_trip(trip_id: int, payload: dict):
-    admin = payload.get("admin")
+async def update_last_trip(
+    trip_id: int, payload: dict, admin: str = Depends(require_admin)
+):
     trip = payload.get("trip")
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
     if not trip:
         raise HTTPException(status_code=400, detail="Missing trip data")
 
@@ -191,31 +242,33 @@ def update_last_trip(trip_id: int, payload: dict):
         raise HTTPException(status_code=400, detail="No fields to update")
 
     values.append(trip_id)
-    db.execute(f"UPDATE last_trips SET {', '.join(fields)} WHERE id = ?", values)
+    replaced = []
+    if trip.get("images") is not None:
+        replaced = await row_images(db, "last_trips", trip_id)
+    await db.execute(f"UPDATE last_trips SET {', '.join(fields)} WHERE id = ?", values)
+    catalog_cache.invalidate("last_trips", trip_id)
+    await upload_store.release(db, replaced)
     return {"message": "Trip updated"}
 
 
 @router.delete("/api/admin/last_trips/{trip_id}")
-def delete_last_trip(trip_id: int, payload: dict):
-    admin = payload.get("admin")
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
-    db.execute("DELETE FROM last_trips WHERE id = ?", (trip_id,))
+async def delete_last_trip(trip_id: int, admin: str = Depends(require_admin)):
+    images = await row_images(db, "last_trips", trip_id)
+    await db.execute("DELETE FROM last_trips WHERE id = ?", (trip_id,))
+    catalog_cache.invalidate("last_trips", trip_id)
+    await upload_store.release(db, images)
     return {"message": "Trip deleted"}
 
 
 @router.put("/api/admin/last_trips/{trip_id}/comments/{comment_id}")
-def admin_update_comment(trip_id: int, comment_id: int, payload: dict):
-    admin = payload.get("admin")
+async def admin_update_comment(
+    trip_id: int, comment_id: int, payload: dict, admin: str = Depends(require_admin)
+):
     update = payload.get("update") or {}
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
     # Ensure trip and comment exist and are linked
-    if not db.fetchone("SELECT 1 FROM last_trips WHERE id = ?", (trip_id,)):
+    if not await db.fetchone("SELECT 1 FROM last_trips WHERE id = ?", (trip_id,)):
         raise HTTPException(status_code=404, detail="Trip not found")
-    if not db.fetchone(
+    if not await db.fetchone(
         "SELECT 1 FROM last_trip_comments WHERE id = ? AND trip_id = ?",
         (comment_id, trip_id),
     ):
@@ -234,37 +287,31 @@ def admin_update_comment(trip_id: int, comment_id: int, payload: dict):
         raise HTTPException(status_code=400, detail="No fields to update")
 
     values.append(comment_id)
-    db.execute(
+    await db.execute(
         f"UPDATE last_trip_comments SET {', '.join(fields)} WHERE id = ?", values
     )
+    catalog_cache.invalidate("last_trips", trip_id, content=False)
     return {"message": "Comment updated"}
 
 
 @router.delete("/api/admin/last_trips/{trip_id}/comments/{comment_id}")
-def admin_delete_comment(trip_id: int, comment_id: int, payload: dict):
-    admin = payload.get("admin")
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
-    # Ensure trip and comment exist and are linked
-    if not db.fetchone("SELECT 1 FROM last_trips WHERE id = ?", (trip_id,)):
+async def admin_delete_comment(
+    trip_id: int, comment_id: int, admin: str = Depends(require_admin)
+):
+    if not await db.fetchone("SELECT 1 FROM last_trips WHERE id = ?", (trip_id,)):
         raise HTTPException(status_code=404, detail="Trip not found")
-    if not db.fetchone(
-        "SELECT 1 FROM last_trip_comments WHERE id = ? AND trip_id = ?",
-        (comment_id, trip_id),
-    ):
+    # Only deletes a comment linked to this trip
+    if not await db.run(delete_comment, db.sync, trip_id, comment_id):
         raise HTTPException(status_code=404, detail="Comment not found")
-
-    db.execute("DELETE FROM last_trip_comments WHERE id = ?", (comment_id,))
+    catalog_cache.invalidate("last_trips", trip_id, content=False)
     return {"message": "Comment deleted"}
 
 
 @router.post("/api/admin/last_trips/list")
-def admin_list_last_trips(payload: dict):
-    admin = payload.get("admin")
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    rows = db.fetchall_dicts(
-        "SELECT * FROM last_trips ORDER BY datetime(created_at) DESC"
+async def admin_list_last_trips(admin: str = Depends(require_admin)):
+    # The admin table lists every trip
+    rows = await db.fetchall_dicts(
+        "SELECT * FROM last_trips /* full scan */ ORDER BY datetime(created_at) DESC",
+        table="last_trips",
     )
     return {"trips": rows}
@@ -1,69 +1,109 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from typing import List
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Request, Query
+from typing import Any, List, Optional, Tuple
 import json
-import os
-import shutil
-import re
-from datetime import datetime
 from src.schemas import PicnicSpot, PicnicSpotUpdate
-from src.db_ops import Database, verify_admin
+from src.db_ops import async_db as db
+from src.admin_auth import require_admin
+from src.uploads import row_images, upload_store
+from src.cache import cached_json, catalog_cache
+from src.images import with_variants
+from src.pagination import fetch_page
+from src.utils import config
 
 router = APIRouter(tags=["spots"])
 
-db = Database()
+# sort key -> (column, descending)
+SPOT_SORTS = {
+    "id": ("id", False),
+    "newest": ("id", True),
+    "price_asc": ("price", False),
+    "price_desc": ("price", True),
+}
 
 
 @router.post("/api/admin/upload/spot")
 async def upload_spot_images(
     files: List[UploadFile] = File(...),
-    username: str = Form(...),
-    password: str = Form(...),
+    admin: str = Depends(require_admin),
 ):
-    if not verify_admin(username, password):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
-    os.makedirs(os.path.join("images", "spots"), exist_ok=True)
-    saved_paths = []
-    for file in files:
-        original = file.filename or "upload"
-        base, ext = os.path.splitext(original)
-        safe_base = re.sub(r"[^A-Za-z0-9_-]+", "_", base) or "image"
-        unique_suffix = datetime.now().strftime("%Y%m%d%H%M%S%f")
-        new_name = f"{safe_base}_{unique_suffix}{ext}"
-        dest_path = os.path.join("images", "spots", new_name)
-        with open(dest_path, "wb") as out:
-            shutil.copyfileobj(file.file, out)
-        saved_paths.append(f"/images/spots/{new_name}")
-        file.file.close()
-
-    return {"paths": saved_paths}
+    stored = await upload_store.save(files, "spots")
+    return {
+        "paths": [f.path for f in stored],
+        "files": [f._asdict() for f in stored],
+    }
 
 
 @router.get("/api/spots")
-def get_spots():
-    result = db.fetchall_dicts("SELECT * FROM picnic_spots WHERE available = 1")
-    return {"spots": result}
+async def get_spots(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=config.CATALOG_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    location: Optional[str] = None,
+    sort: str = "id",
+):
+    if sort not in SPOT_SORTS:
+        raise HTTPException(
+            status_code=400, detail=f"sort must be one of {', '.join(SPOT_SORTS)}"
+        )
+    limit = limit or config.CATALOG_PAGE_SIZE
+    where, params = spot_filters(min_price, max_price, location)
+
+    async def load():
+        spots, next_cursor = await fetch_page(
+            db, "picnic_spots", where, params, sort, SPOT_SORTS[sort], limit, cursor
+        )
+        return {
+            "spots": await with_variants(spots, "picnic_spots"),
+            "next_cursor": next_cursor,
+        }
+
+    key = ("list", sort, limit, cursor, tuple(where), tuple(params))
+    return (await cached_json("picnic_spots", key, load)).response(request)
+
+
+def spot_filters(
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    location: Optional[str] = None,
+) -> Tuple[List[str], List[Any]]:
+    """WHERE clauses and parameters for the public destination listing."""
+    where = ["available = 1"]
+    params = []
+    if min_price is not None:
+        where.append("price >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        where.append("price <= ?")
+        params.append(max_price)
+    if location:
+        where.append("location = ? COLLATE NOCASE")
+        params.append(location)
+    return where, params
 
 
 @router.get("/api/spots/{spot_id}")
-def get_spot(spot_id: int):
-    spot = db.fetchone_dict("SELECT * FROM picnic_spots WHERE id = ?", (spot_id,))
+async def get_spot(spot_id: int, request: Request):
+    async def load():
+        spot = await db.fetchone_dict(
+            "SELECT * FROM picnic_spots WHERE id = ?", (spot_id,), table="picnic_spots"
+        )
+        return await with_variants(spot, "picnic_spots")
+
+    spot = await cached_json("picnic_spots", ("detail", spot_id), load, row_id=spot_id)
     if not spot:
         raise HTTPException(status_code=404, detail="Spot not found")
-    return spot
+    return spot.response(request)
 
 
 @router.post("/api/admin/spots")
-def add_spot(payload: dict):
+async def add_spot(payload: dict, admin: str = Depends(require_admin)):
     spot = payload.get("spot")
-    admin = payload.get("admin")
-
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
 
     spot_obj = PicnicSpot(**spot)
 
-    spot_id = db.insert(
+    spot_id = await db.insert(
         """
         INSERT INTO picnic_spots (name, price, location, images, short_description, detailed_description, trip_images, hotel_images, available)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -80,18 +120,15 @@ def add_spot(payload: dict):
             spot_obj.available,
         ),
     )
+    catalog_cache.invalidate("picnic_spots", spot_id)
 
     return {"message": "Spot added successfully", "id": spot_id}
 
 
 @router.put("/api/admin/spots/{spot_id}")
-def update_spot(spot_id: int, payload: dict):
-    admin = payload.get("admin")
+async def update_spot(spot_id: int, payload: dict, admin: str = Depends(require_admin)):
     spot = payload.get("spot")
 
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
     spot_update = PicnicSpotUpdate(**spot)
 
     update_fields = []
@@ -131,17 +168,24 @@ def update_spot(spot_id: int, payload: dict):
     values.append(spot_id)
     query = f"UPDATE picnic_spots SET {', '.join(update_fields)} WHERE id = ?"
 
-    db.execute(query, values)
+    replaced = []
+    if any(
+        v is not None
+        for v in (spot_update.images, spot_update.trip_images, spot_update.hotel_images)
+    ):
+        replaced = await row_images(db, "picnic_spots", spot_id)
+    await db.execute(query, values)
+    catalog_cache.invalidate("picnic_spots", spot_id)
+    await upload_store.release(db, replaced)
 
     return {"message": "Spot updated successfully"}
 
 
 @router.delete("/api/admin/spots/{spot_id}")
-def delete_spot(spot_id: int, payload: dict):
-    admin = payload.get("admin")
-    if not admin or not verify_admin(admin.get("username"), admin.get("password")):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
-    db.execute("DELETE FROM picnic_spots WHERE id = ?", (spot_id,))
+async def delete_spot(spot_id: int, admin: str = Depends(require_admin)):
+    images = await row_images(db, "picnic_spots", spot_id)
+    await db.execute("DELETE FROM picnic_spots WHERE id = ?", (spot_id,))
+    catalog_cache.invalidate("picnic_spots", spot_id)
+    await upload_store.release(db, images)
 
     return {"message": "Spot deleted successfully"}
@@ -1,15 +1,14 @@
 # PI: UserAuth - Users API (register, login, logout, me)
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr
-import bcrypt
 from datetime import datetime
 import secrets
-from src.db_ops import Database
+from src.db_ops import async_db as db
+from src.passwords import hasher
+from src.sessions import end_session, resolve_session, session_expiry
 
 router = APIRouter(tags=["users"])
 
-db = Database()
-
 
 class UserCreate(BaseModel):
     full_name: str
@@ -28,12 +27,12 @@ class Token(BaseModel):
 
 
 @router.post("/api/users/register")
-def register_user(payload: UserCreate):
+async def register_user(payload: UserCreate):
     # Validate password match
     if payload.password != payload.confirm_password:
         raise HTTPException(status_code=400, detail="Passwords do not match")
     # Check if email already exists
-    existing = db.fetchone(
+    existing = await db.fetchone(
         "SELECT id FROM users WHERE email = ?",
         (payload.email,),
     )
@@ -42,10 +41,8 @@ def register_user(payload: UserCreate):
             status_code=400, detail="User with this email already exists"
         )
     # Hash password and create user
-    password_bytes = payload.password.encode("utf-8")
-    salt = bcrypt.gensalt()
-    pwd_hash = bcrypt.hashpw(password_bytes, salt).decode("utf-8")
-    db.insert(
+    pwd_hash = await hasher.hash(payload.password)
+    await db.insert(
         """
         INSERT INTO users (full_name, email, password_hash, created_at)
         VALUES (?, ?, ?, ?)
@@ -56,8 +53,8 @@ def register_user(payload: UserCreate):
 
 
 @router.post("/api/users/login")
-def login_user(payload: UserLogin):
-    user = db.fetchone(
+async def login_user(payload: UserLogin):
+    user = await db.fetchone(
         "SELECT email, password_hash, full_name FROM users WHERE email = ?",
         (payload.email,),
     )
@@ -67,17 +64,27 @@ def login_user(payload: UserLogin):
     user_email = user[0] if isinstance(user, tuple) else user["email"]
     pwd_hash = user[1] if isinstance(user, tuple) else user["password_hash"]
     full_name = user[2] if isinstance(user, tuple) else user["full_name"]
-    password_bytes = payload.password.encode("utf-8")
-    pwd_hash_bytes = pwd_hash.encode("utf-8")
-    if not bcrypt.checkpw(password_bytes, pwd_hash_bytes):
+    if not await hasher.verify(payload.password, pwd_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    # Upgrade hashes made with an older BCRYPT_ROUNDS while we have the password
+    if hasher.needs_rehash(pwd_hash):
+        try:
+            new_hash = await hasher.hash(payload.password)
+        except HTTPException:
+            # Pool saturated: the rehash can wait for a later login
+            new_hash = None
+        if new_hash:
+            await db.execute(
+                "UPDATE users SET password_hash = ? WHERE email = ?",
+                (new_hash, user_email),
+            )
     token = secrets.token_urlsafe(32)
-    db.insert(
+    await db.insert(
         """
-        INSERT INTO sessions (user_email, token, created_at)
-        VALUES (?, ?, ?)
+        INSERT INTO sessions (user_email, token, created_at, expires_at)
+        VALUES (?, ?, ?, ?)
         """,
-        (user_email, token, datetime.utcnow().isoformat()),
+        (user_email, token, datetime.utcnow().isoformat(), session_expiry()),
     )
     return {
         "message": "Login successful",
@@ -88,18 +95,14 @@ def login_user(payload: UserLogin):
 
 
 @router.post("/api/users/logout")
-def logout_user(token: Token):
-    db.execute("DELETE FROM sessions WHERE token = ?", (token.token,))
+async def logout_user(token: Token):
+    await end_session(token.token)
     return {"message": "Logged out"}
 
 
 @router.get("/api/users/me")
-def get_me(token: str):
-    sess = db.fetchone("SELECT user_email FROM sessions WHERE token = ?", (token,))
-    if not sess:
+async def get_me(token: str):
+    user = await resolve_session(token)
+    if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    user_email = sess[0] if isinstance(sess, tuple) else sess["user_email"]
-    user = db.fetchone_dict(
-        "SELECT full_name, email, created_at FROM users WHERE email = ?", (user_email,)
-    )
     return {"user": user}
@@ -0,0 +1,363 @@
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+import json
+import os
+import threading
+import time
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from src.compression import negotiate_encoding, precompress
+from src.utils import config
+
+# Optional fast JSON encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+Listener = Callable[[str, Optional[int]], None]
+
+# Change counters restart at 0 with the process, so ETags also carry a
+# per-process tag to keep them from matching bodies served before a restart.
+_BOOT_TAG = f"{int(time.time()):x}{os.getpid():x}"
+
+
+class _TableEntries:
+    def __init__(self) -> None:
+        self.version = 0
+        # Nothing can have changed since before the process started
+        self.last_modified = time.time()
+        # key -> (row_id, value); row_id None means the entry depends on the
+        # whole table (lists), otherwise only on that one row (detail views)
+        self.entries: "OrderedDict[Hashable, Tuple[Optional[int], Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+
+class CatalogCache:
+    """
+    Versioned in-memory read-through cache for catalog responses.
+    Each table has a change counter bumped by invalidate(); list entries are
+    dropped on any change to their table, detail entries only when their own
+    row changes. Listeners are told about every change so other caches and
+    indexes can follow the same invalidation points; content_only listeners
+    skip changes that leave the catalog rows themselves alone (comment
+    counts, generated image variants).
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._tables: Dict[str, _TableEntries] = {}
+        # (listener, whether it only wants changes to the rows' content)
+        self._listeners: List[Tuple[Listener, bool]] = []
+        self._lock = threading.Lock()
+
+    def _table(self, table: str) -> _TableEntries:
+        t = self._tables.get(table)
+        if t is None:
+            t = self._tables[table] = _TableEntries()
+        return t
+
+    def version(self, table: str) -> int:
+        with self._lock:
+            return self._table(table).version
+
+    def state(self, table: str) -> Tuple[int, float]:
+        """Current (change counter, last change timestamp) of table."""
+        with self._lock:
+            t = self._table(table)
+            return t.version, t.last_modified
+
+    async def get_or_load(
+        self,
+        table: str,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        row_id: Optional[int] = None,
+    ) -> Any:
+        """Return the cached value for key, calling loader on a miss.
+
+        A loader result of None is not cached (e.g. a missing row).
+        """
+        with self._lock:
+            t = self._table(table)
+            if key in t.entries:
+                t.entries.move_to_end(key)
+                t.hits += 1
+                return t.entries[key][1]
+            t.misses += 1
+            version = t.version
+
+        value = await loader()
+
+        with self._lock:
+            t = self._table(table)
+            # Don't store a result that raced with a write to the table
+            if value is not None and t.version == version:
+                t.entries[key] = (row_id, value)
+                t.entries.move_to_end(key)
+                while len(t.entries) > self.max_entries:
+                    t.entries.popitem(last=False)
+        return value
+
+    def invalidate(
+        self, table: str, row_id: Optional[int] = None, content: bool = True
+    ) -> None:
+        """
+        Record a change to table (or one row of it) and drop stale entries.
+        content=False marks a change only to what is derived from the rows.
+        """
+        with self._lock:
+            t = self._table(table)
+            t.version += 1
+            t.last_modified = time.time()
+            t.invalidations += 1
+            if row_id is None:
+                t.entries.clear()
+            else:
+                stale = [
+                    k for k, (rid, _) in t.entries.items() if rid in (None, row_id)
+                ]
+                for k in stale:
+                    del t.entries[k]
+            listeners = [
+                listener
+                for listener, content_only in self._listeners
+                if content or not content_only
+            ]
+        for listener in listeners:
+            listener(table, row_id)
+
+    def subscribe(self, listener: Listener, content_only: bool = False) -> None:
+        with self._lock:
+            self._listeners.append((listener, content_only))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {
+                    "version": t.version,
+                    "entries": len(t.entries),
+                    "hits": t.hits,
+                    "misses": t.misses,
+                    "invalidations": t.invalidations,
+                }
+                for name, t in self._tables.items()
+            }
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire after ttl seconds."""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return None if item is None else item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Unexpired (key, value) pairs, least recently used first."""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (expires, v) in self._data.items() if expires > now]
+
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            stale = [k for k, (expires, _) in self._data.items() if expires <= now]
+            for k in stale:
+                del self._data[k]
+            return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def dumps(value: Any) -> bytes:
+    """Encode value as compact UTF-8 JSON, matching FastAPI's JSONResponse."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(
+        value, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def etag_matches(header: str, etags: Iterable[str]) -> bool:
+    """Whether an If-None-Match header (a list, W/ tags or *) names one of etags."""
+    etags = set(etags)
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate in etags:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, last_modified: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have one-second resolution
+    return int(last_modified) <= since
+
+
+class CachedBody:
+    """
+    A response body encoded (and compressed) once and served as-is until its
+    table changes, along with the validators used to answer conditional
+    requests. bodies maps each content encoding to its bytes; every encoding
+    gets its own ETag since the bytes differ.
+    """
+
+    __slots__ = ("bodies", "etag", "last_modified", "cache_control")
+
+    def __init__(
+        self,
+        bodies: Dict[str, bytes],
+        etag: str,
+        last_modified: float,
+        cache_control: str,
+    ) -> None:
+        self.bodies = bodies
+        self.etag = etag
+        self.last_modified = last_modified
+        self.cache_control = cache_control
+
+    def etag_for(self, encoding: str) -> str:
+        if encoding == "identity":
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
+
+    def headers(self, encoding: str = "identity") -> Dict[str, str]:
+        headers = {
+            "ETag": self.etag_for(encoding),
+            "Last-Modified": formatdate(self.last_modified, usegmt=True),
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return headers
+
+    def is_fresh(self, request: Request) -> bool:
+        """True if the client's copy is current (If-None-Match wins over IMS)."""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, map(self.etag_for, self.bodies))
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is not None:
+            return _not_modified_since(if_modified_since, self.last_modified)
+        return False
+
+    def response(self, request: Request) -> Response:
+        encoding = negotiate_encoding(
+            request.headers.get("accept-encoding"), self.bodies
+        )
+        headers = self.headers(encoding)
+        if self.is_fresh(request):
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=self.bodies[encoding],
+            media_type="application/json",
+            headers=headers,
+        )
+
+
+async def cached_json(
+    table: str,
+    key: Hashable,
+    loader: Callable[[], Awaitable[Any]],
+    row_id: Optional[int] = None,
+) -> Optional[CachedBody]:
+    """Read-through catalog_cache lookup that stores the JSON-encoded payload.
+
+    Returns None when the loader finds nothing (e.g. an unknown id). The
+    body is compressed here, once per table change, not per request.
+    """
+
+    async def load() -> Optional[CachedBody]:
+        version, last_modified = catalog_cache.state(table)
+        value = await loader()
+        if value is None:
+            return None
+        # Compressed on the request that missed, so not at the static
+        # assets' maximum levels
+        bodies = await run_in_threadpool(
+            precompress,
+            dumps(value),
+            config.CATALOG_GZIP_LEVEL,
+            config.CATALOG_BROTLI_QUALITY,
+        )
+        return CachedBody(
+            bodies,
+            etag=f'"{table}-{version}-{_BOOT_TAG}"',
+            last_modified=last_modified,
+            cache_control=(
+                config.CACHE_CONTROL_CATALOG_LIST
+                if row_id is None
+                else config.CACHE_CONTROL_CATALOG_DETAIL
+            ),
+        )
+
+    return await catalog_cache.get_or_load(table, key, load, row_id=row_id)
+
+
+catalog_cache = CatalogCache(max_entries=config.CATALOG_CACHE_MAX_ENTRIES)
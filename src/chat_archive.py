@@ -0,0 +1,210 @@
+# PI: Chatbot - monthly archive partitions for cold chat_logs rows
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+import re
+import time
+
+from src.db_ops import Database
+
+PARTITION = re.compile(r"chat_logs_(\d{6})")
+
+PARTITIONS_SQL = """
+    SELECT name FROM sqlite_master
+    WHERE type = 'table' AND name GLOB 'chat_logs_[0-9][0-9][0-9][0-9][0-9][0-9]'
+"""
+
+# Oldest live rows first, by primary key
+SCAN_SQL = """
+    SELECT id, session_id, user_email, role, message, created_at
+    FROM chat_logs WHERE id > ? ORDER BY id LIMIT ?
+"""
+
+DELETE_SQL = "DELETE FROM chat_logs WHERE id = ?"
+
+# Which months hold a session's archived messages, so a history read only
+# touches partitions when the session has any
+SESSION_MONTHS_SQL = """
+    SELECT first_month, last_month FROM chat_log_archive_sessions
+    WHERE session_id = ?
+"""
+
+UPSERT_SESSION_SQL = """
+    INSERT INTO chat_log_archive_sessions (session_id, first_month, last_month)
+    VALUES (?, ?, ?)
+    ON CONFLICT(session_id) DO UPDATE SET
+        first_month = min(first_month, excluded.first_month),
+        last_month = max(last_month, excluded.last_month)
+"""
+
+# Run by the archive command after dropping partitions
+FORGET_SESSIONS_SQL = """
+    DELETE FROM chat_log_archive_sessions /* full scan */ WHERE last_month < ?
+"""
+
+TRIM_SESSIONS_SQL = """
+    UPDATE chat_log_archive_sessions /* full scan */
+    SET first_month = ? WHERE first_month < ?
+"""
+
+
+def month_of(created_at: str) -> str:
+    """The YYYYMM partition month of an ISO timestamp."""
+    return created_at[:4] + created_at[5:7]
+
+
+def partition_name(month: str) -> str:
+    if not re.fullmatch(r"\d{6}", month):
+        raise ValueError(f"Invalid archive month: {month!r}")
+    return f"chat_logs_{month}"
+
+
+def partitions(database: Database) -> List[str]:
+    """Months that have an archive partition, oldest first."""
+    rows = database.fetchall(PARTITIONS_SQL)
+    return sorted(PARTITION.fullmatch(row[0]).group(1) for row in rows)
+
+
+def ensure_partition(database: Database, month: str) -> None:
+    table = partition_name(month)
+    database.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            user_email TEXT,
+            role TEXT NOT NULL,
+            message TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """
+    )
+    database.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_session ON {table}(session_id, id)"
+    )
+
+
+def archived_messages(
+    database: Database, session_id: str, limit: int
+) -> List[Dict[str, Any]]:
+    """
+    A session's last `limit` archived messages, newest first. Costs one
+    primary key lookup for sessions that have nothing archived.
+    """
+    months = database.fetchone(SESSION_MONTHS_SQL, (session_id,))
+    if months is None or limit <= 0:
+        return []
+    first, last = months
+    messages: List[Dict[str, Any]] = []
+    for month in reversed(partitions(database)):
+        if month > last:
+            continue
+        if month < first or len(messages) >= limit:
+            break
+        table = partition_name(month)
+        messages += database.fetchall_dicts(
+            f"""
+            SELECT session_id, user_email, role, message, created_at
+            FROM {table} WHERE session_id = ? ORDER BY id DESC LIMIT ?
+        """,
+            (session_id, limit - len(messages)),
+            table="chat_logs",
+        )
+    return messages
+
+
+def archive_batch(
+    database: Database, cutoff: str, batch_size: int, after_id: int = 0
+) -> Tuple[int, int]:
+    """
+    Move the rows created before cutoff among the next batch_size chat_logs
+    rows after after_id into their month's partition, in one short
+    transaction. Returns (rows moved, last id looked at), or (0, 0) past
+    the end of the table.
+    """
+    rows = database.fetchall(SCAN_SQL, (after_id, batch_size))
+    if not rows:
+        return 0, 0
+    cold = [tuple(row) for row in rows if row["created_at"] < cutoff]
+    last_id = rows[-1]["id"]
+    if not cold:
+        return 0, last_id
+    by_month: Dict[str, List[Tuple[Any, ...]]] = {}
+    sessions: Dict[str, Tuple[str, str]] = {}
+    for row in cold:
+        month = month_of(row[5])
+        by_month.setdefault(month, []).append(row)
+        first, last = sessions.get(row[1], (month, month))
+        sessions[row[1]] = (min(first, month), max(last, month))
+    for month in by_month:
+        ensure_partition(database, month)
+    with database.transaction() as conn:
+        # Ids are kept, so ORDER BY id still orders a session across tables
+        for month, month_rows in by_month.items():
+            conn.executemany(
+                f"""
+                INSERT OR IGNORE INTO {partition_name(month)}
+                    (id, session_id, user_email, role, message, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """,
+                month_rows,
+            )
+        conn.executemany(
+            UPSERT_SESSION_SQL,
+            [(s, first, last) for s, (first, last) in sessions.items()],
+        )
+        conn.executemany(DELETE_SQL, [(row[0],) for row in cold])
+    return len(cold), last_id
+
+
+def archive(
+    database: Database, hot_days: float, batch_size: int, pause: float
+) -> Dict[str, int]:
+    """
+    Move every chat_logs row older than hot_days into monthly partitions,
+    batch by batch. Each batch holds the write lock only for its own
+    inserts and delete, and the pause between batches lets the server's
+    chat log writes through.
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=hot_days)).isoformat()
+    moved = batches = 0
+    after_id = 0
+    # The whole hot table is looked at (reads take no write lock), since
+    # batched writes can commit rows slightly out of created_at order
+    while True:
+        count, after_id = archive_batch(database, cutoff, batch_size, after_id)
+        if not after_id:
+            break
+        if count:
+            moved += count
+            batches += 1
+            if pause > 0:
+                time.sleep(pause)
+    return {"moved": moved, "batches": batches}
+
+
+def drop_partitions(database: Database, keep_months: int) -> List[str]:
+    """
+    Drop archive partitions older than the last keep_months months (the
+    current month counts as one); returns the months dropped.
+    """
+    now = datetime.utcnow()
+    index = now.year * 12 + now.month - 1 - (keep_months - 1)
+    oldest_kept = f"{index // 12:04d}{index % 12 + 1:02d}"
+    dropped = [month for month in partitions(database) if month < oldest_kept]
+    for month in dropped:
+        # Dropping a whole table frees its pages without a per-row delete
+        database.execute(f"DROP TABLE IF EXISTS {partition_name(month)}")
+    if dropped:
+        database.execute(FORGET_SESSIONS_SQL, (oldest_kept,))
+        database.execute(TRIM_SESSIONS_SQL, (oldest_kept, oldest_kept))
+    return dropped
+
+
+def compact(database: Database, vacuum: bool = False) -> None:
+    """
+    Hand the space freed by archiving back: checkpoint and truncate the WAL,
+    and with vacuum=True rebuild the file (locks the database while it runs).
+    """
+    if vacuum:
+        database.execute("VACUUM")
+    database.fetchall("PRAGMA wal_checkpoint(TRUNCATE)")
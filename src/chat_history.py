@@ -0,0 +1,247 @@
+# PI: Chatbot - in-memory ring buffer of recent turns per chat session
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+import asyncio
+import threading
+
+from src.chat_archive import archived_messages
+from src.db_ops import AsyncDatabase, async_db
+from src.utils import config
+from src.write_behind import BatchWriter
+
+Message = Dict[str, Any]
+
+# Column order of chat_logs rows as written and buffered
+FIELDS = ("session_id", "user_email", "role", "message", "created_at")
+
+INSERT_SQL = """
+    INSERT INTO chat_logs (session_id, user_email, role, message, created_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# One indexed read (idx_chat_logs_session) fills a session's buffer
+HISTORY_SQL = """
+    SELECT session_id, user_email, role, message, created_at
+    FROM chat_logs WHERE session_id = ? ORDER BY id DESC LIMIT ?
+"""
+
+# Rough per-message overhead on top of the text (dict, strings, ids)
+MESSAGE_OVERHEAD = 200
+
+
+def _size(message: Message) -> int:
+    return len(message["message"]) + MESSAGE_OVERHEAD
+
+
+def _key(message: Message) -> Tuple[str, str, str]:
+    # Messages are buffered before they have a row id (see BatchWriter);
+    # the microsecond timestamp orders and identifies them within a session
+    return message["created_at"], message["role"], message["message"]
+
+
+class _Session:
+    __slots__ = ("messages", "keys", "complete", "size")
+
+    def __init__(self, capacity: int) -> None:
+        self.messages: Deque[Message] = deque(maxlen=capacity)
+        self.keys: Set[Tuple[str, str, str]] = set()
+        # True when the buffer holds the session's whole history
+        self.complete = False
+        self.size = 0
+
+
+class ChatHistory:
+    """
+    The last `capacity` messages of recently active chat sessions, so chat
+    replies and /api/chat/history don't query SQLite on every turn.
+
+    A session's buffer is filled from chat_logs on first use and then kept
+    current by append() as messages are logged. Sessions are evicted least
+    recently used first once there are more than max_sessions of them or
+    their messages take more than max_bytes. chat_logs stays the source of
+    truth: requests for more than the buffer holds go to the database,
+    reaching into the archive partitions when chat_logs runs short. The
+    buffer is per process, so run one worker or accept that a session's
+    turns handled by another worker show up after it is evicted here.
+    """
+
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        capacity: int,
+        max_sessions: int,
+        max_bytes: int,
+        pending: Optional[Callable[[str], List[Message]]] = None,
+    ) -> None:
+        self.db = db
+        # Messages of a session logged but not yet committed to chat_logs
+        self.pending = pending
+        self.capacity = capacity
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hydrating: Dict[str, "asyncio.Future[None]"] = {}
+        # Messages logged while their session's buffer was being filled
+        self._early: Dict[str, List[Message]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _evict(self) -> None:
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+        ):
+            _, session = self._sessions.popitem(last=False)
+            self._bytes -= session.size
+            self.evictions += 1
+
+    @staticmethod
+    def _push(session: _Session, message: Message) -> int:
+        """
+        Add one message to a buffer at its place in time order, dropping the
+        oldest when full; returns the change in the buffer's size. Messages
+        can arrive out of order (concurrent requests, a write that waited
+        on the queue), so this isn't always an append.
+        """
+        key = _key(message)
+        if key in session.keys:
+            return 0  # Already read from chat_logs
+        messages = session.messages
+        delta = 0
+        if len(messages) == messages.maxlen:
+            if key < _key(messages[0]):
+                return 0  # Older than everything the buffer keeps
+            dropped = messages.popleft()
+            session.keys.discard(_key(dropped))
+            delta -= _size(dropped)
+            session.complete = False
+        # Usually the newest, so search from the end
+        position = len(messages)
+        while position and _key(messages[position - 1]) > key:
+            position -= 1
+        messages.insert(position, message)
+        session.keys.add(key)
+        delta += _size(message)
+        session.size += delta
+        return delta
+
+    def append(self, message: Message) -> None:
+        """Record a message just logged to chat_logs."""
+        session_id = message["session_id"]
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                if session_id in self._hydrating:
+                    # The query may have run before this insert
+                    self._early.setdefault(session_id, []).append(message)
+                # Otherwise the next read hydrates it, this message included
+                return
+            self._sessions.move_to_end(session_id)
+            self._bytes += self._push(session, message)
+            self._evict()
+
+    async def _read(self, session_id: str, limit: int) -> Tuple[List[Message], bool]:
+        """
+        (last `limit` messages from chat_logs and the write queue, oldest
+        first; whether that is the session's whole history)
+        """
+        # Taken before the query: a queued row is either still queued, or
+        # committed and read by the query (then deduplicated below)
+        queued = self.pending(session_id) if self.pending else []
+        rows = await self.db.fetchall_dicts(
+            HISTORY_SQL, (session_id, limit), table="chat_logs"
+        )
+        if len(rows) < limit:
+            # Older messages may have been moved to the monthly archive
+            rows += await self.db.run(
+                archived_messages, self.db.sync, session_id, limit - len(rows)
+            )
+        merged = {_key(m): m for m in [*reversed(rows), *queued]}
+        messages = [merged[key] for key in sorted(merged)]
+        return messages[-limit:], len(rows) < limit
+
+    async def _hydrate(self, session_id: str) -> None:
+        messages, complete = await self._read(session_id, self.capacity)
+        session = _Session(self.capacity)
+        for message in messages:
+            self._push(session, message)
+        session.complete = complete
+        with self._lock:
+            for message in self._early.pop(session_id, []):
+                self._push(session, message)
+            self._sessions[session_id] = session
+            self._bytes += session.size
+            self._evict()
+
+    def _done_hydrating(self, session_id: str) -> None:
+        with self._lock:
+            self._hydrating.pop(session_id, None)
+            self._early.pop(session_id, None)
+
+    async def recent(self, session_id: str, limit: int) -> List[Message]:
+        """The session's last `limit` messages, oldest first."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                self.hits += 1
+        if session is None:
+            self.misses += 1
+            # Concurrent first reads of a session share one query
+            pending = self._hydrating.get(session_id)
+            if pending is None:
+                pending = asyncio.ensure_future(self._hydrate(session_id))
+                self._hydrating[session_id] = pending
+                pending.add_done_callback(lambda _: self._done_hydrating(session_id))
+            await asyncio.shield(pending)
+            with self._lock:
+                session = self._sessions.get(session_id)
+        if limit <= 0:
+            return []
+        with self._lock:
+            if session is not None and (
+                limit <= len(session.messages) or session.complete
+            ):
+                return list(session.messages)[-limit:]
+        # Evicted right away, or more requested than the buffer holds
+        messages, _ = await self._read(session_id, limit)
+        return messages
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Chat rows are written behind the request in batches (CHAT_LOG_DURABILITY)
+chat_log_writer = BatchWriter(
+    async_db,
+    INSERT_SQL,
+    durability=config.CHAT_LOG_DURABILITY,
+    max_batch=config.CHAT_LOG_BATCH_SIZE,
+    interval=config.CHAT_LOG_FLUSH_MS / 1000,
+    max_queue=config.CHAT_LOG_MAX_QUEUE,
+    max_retries=config.CHAT_LOG_MAX_RETRIES,
+    queue_timeout=config.CHAT_LOG_QUEUE_TIMEOUT_MS / 1000,
+)
+
+
+def _queued_messages(session_id: str) -> List[Message]:
+    rows = chat_log_writer.pending(lambda row: row[0] == session_id)
+    return [dict(zip(FIELDS, row)) for row in rows]
+
+
+chat_history = ChatHistory(
+    async_db,
+    capacity=config.CHAT_HISTORY_BUFFER,
+    max_sessions=config.CHAT_HISTORY_MAX_SESSIONS,
+    max_bytes=int(config.CHAT_HISTORY_MAX_MB * 1024 * 1024),
+    pending=_queued_messages,
+)
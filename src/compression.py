@@ -0,0 +1,209 @@
+# PI: Compression - content negotiation and gzip/brotli response compression
+from typing import Dict, Iterable, Optional
+import gzip
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from src.utils import config
+
+# Optional: brotli output; without it only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Worth compressing; images, video and fonts are already compressed
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+def accepted_encodings(header: Optional[str]) -> set:
+    """Encodings an Accept-Encoding header allows (q=0 entries excluded)."""
+    accepted = set()
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def negotiate_encoding(header: Optional[str], available: Iterable[str]) -> str:
+    """Best of br/gzip the client accepts and we have, else "identity"."""
+    accepted = accepted_encodings(header)
+    for encoding in ("br", "gzip"):
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+def available_encodings() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    content_type = (content_type or "").lower()
+    # Server-sent events must reach the client as they are written
+    if content_type.startswith("text/event-stream"):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """body in one encoding; level is the gzip level or brotli quality."""
+    if encoding == "gzip":
+        return gzip.compress(
+            body, compresslevel=config.GZIP_LEVEL if level is None else level, mtime=0
+        )
+    if encoding == "br":
+        return brotli.compress(
+            body, quality=config.BROTLI_QUALITY if level is None else level
+        )
+    return body
+
+
+def precompress(
+    body: bytes, gzip_level: int = 9, brotli_quality: int = 11
+) -> Dict[str, bytes]:
+    """
+    Every available encoding of a body served many times. The defaults are
+    the strongest settings, for build-time static assets whose cost is paid
+    once at startup; bodies compressed while a request waits pass lower
+    levels. Encodings that don't make the body smaller are left out;
+    "identity" is always present.
+    """
+    bodies = {"identity": body}
+    if len(body) < config.COMPRESSION_MIN_BYTES:
+        return bodies
+    levels = {"gzip": gzip_level, "br": brotli_quality}
+    for encoding in available_encodings():
+        data = compress(body, encoding, levels[encoding])
+        if len(data) < len(body):
+            bodies[encoding] = data
+    return bodies
+
+
+def add_vary(headers: MutableHeaders, value: str = "Accept-Encoding") -> None:
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = value
+    elif value.lower() not in vary.lower():
+        headers["Vary"] = f"{vary}, {value}"
+
+
+class _StreamCompressor:
+    """Incremental gzip/brotli encoder for responses sent in several chunks."""
+
+    def __init__(self, encoding: str) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=config.BROTLI_QUALITY)
+        else:
+            # wbits 16+ writes the gzip header and trailer
+            self._gz = zlib.compressobj(config.GZIP_LEVEL, zlib.DEFLATED, 16 + 15)
+
+    def process(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data)
+        return self._gz.compress(data)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._br.finish()
+        return self._gz.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of compressible types at least minimum_size bytes
+    long with the best encoding the client accepts. Responses that already
+    carry a Content-Encoding (precompressed static and catalog bodies) are
+    passed through untouched, as are partial content and event streams.
+    """
+
+    def __init__(self, app, minimum_size: int) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding"), available_encodings()
+        )
+        if encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    "content-encoding" in headers
+                    or "content-range" in headers
+                    or message["status"] in (204, 206, 304)
+                    or not is_compressible(headers.get("content-type"))
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held back until the first body chunk shows how big it is
+                    start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not more_body and len(body) < self.minimum_size:
+                    # Too small to be worth it; still varies by Accept-Encoding
+                    add_vary(headers)
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers["Content-Encoding"] = encoding
+                add_vary(headers)
+                if not more_body:
+                    body = compress(body, encoding)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    passthrough = True
+                    return
+                # Streamed: the final length isn't known up front
+                del headers["Content-Length"]
+                compressor = _StreamCompressor(encoding)
+                await send(start)
+                start = None
+
+            data = compressor.process(body)
+            if not more_body:
+                data += compressor.finish()
+            if data or not more_body:
+                await send(
+                    {"type": "http.response.body", "body": data, "more_body": more_body}
+                )
+
+        await self.app(scope, receive, compressing_send)
@@ -1,9 +1,33 @@
 import sqlite3
 import json
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Optional, Sequence, Tuple
 
 DB_PATH = "rental.db"
 
+# Columns that hold JSON-encoded text, per table. Only these are decoded;
+# free-text columns (descriptions, comments, chat messages) are returned as
+# stored even if they happen to start with a bracket.
+JSON_COLUMNS: Dict[str, FrozenSet[str]] = {
+    "cars": frozenset({"images"}),
+    "picnic_spots": frozenset({"images", "trip_images", "hotel_images"}),
+    "last_trips": frozenset({"spots", "images"}),
+}
+
+# JSON columns listing /images/... paths; a stored upload is kept while any
+# row still names it in one of these
+IMAGE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "cars": ("images",),
+    "picnic_spots": ("images", "trip_images", "hotel_images"),
+    "last_trips": ("images",),
+}
+
+# Used when a query doesn't say which table it reads from. The JSON column
+# names are not reused as plain text anywhere in the schema.
+ALL_JSON_COLUMNS: FrozenSet[str] = frozenset().union(*JSON_COLUMNS.values())
+
+RowDecoder = Callable[[Sequence[Any]], Dict[str, Any]]
+
 
 def get_db_connection():
     conn = sqlite3.connect(DB_PATH)
@@ -11,13 +35,32 @@ def get_db_connection():
     return conn
 
 
-def row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
-    d = dict(row)
-    # Attempt to decode JSON fields
-    for key, val in d.items():
-        if isinstance(val, str) and (val.startswith("[") or val.startswith("{")):
-            try:
-                d[key] = json.loads(val)
-            except Exception:
-                pass
-    return d
+def decode_json(val: Any) -> Any:
+    if isinstance(val, str):
+        try:
+            return json.loads(val)
+        except ValueError:
+            pass
+    return val
+
+
+@lru_cache(maxsize=256)
+def row_decoder(columns: Tuple[str, ...], table: Optional[str] = None) -> RowDecoder:
+    """
+    Build (once per result shape) a function turning a plain row tuple into a
+    dict, decoding only the registered JSON columns.
+    """
+    json_columns = JSON_COLUMNS.get(table, frozenset()) if table else ALL_JSON_COLUMNS
+    items = []
+    for i, name in enumerate(columns):
+        value = f"row[{i}]"
+        if name in json_columns:
+            value = f"decode_json({value})"
+        items.append(f"{name!r}: {value}")
+    # A generated dict literal avoids per-row zip()/loop overhead
+    src = "lambda row: {" + ", ".join(items) + "}"
+    return eval(src, {"decode_json": decode_json})
+
+
+def row_to_dict(row: sqlite3.Row, table: Optional[str] = None) -> Dict[str, Any]:
+    return row_decoder(tuple(row.keys()), table)(tuple(row))
@@ -1,76 +1,286 @@
-from typing import Any, Dict, List, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+import asyncio
+import queue
+import re
 import sqlite3
+import threading
 
-from src.db import DB_PATH, row_to_dict
+from src.db import DB_PATH, row_decoder
+from src.utils import config
 
 
-class Database:
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within the timeout."""
+
+
+# Pragmas applied to every pooled connection, in order. journal_mode goes
+# first since it is persistent and changes how the rest behave.
+PRAGMA_NAMES = (
+    "journal_mode",
+    "synchronous",
+    "busy_timeout",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
+)
+
+
+def pragma_profile() -> Dict[str, str]:
+    """Pragma settings from Config, keyed by pragma name."""
+    return {
+        "journal_mode": config.DB_JOURNAL_MODE,
+        "synchronous": config.DB_SYNCHRONOUS,
+        "busy_timeout": str(config.DB_BUSY_TIMEOUT_MS),
+        "cache_size": str(config.DB_CACHE_SIZE),
+        "mmap_size": str(config.DB_MMAP_SIZE),
+        "temp_store": config.DB_TEMP_STORE,
+    }
+
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: Dict[str, str]) -> None:
+    for name in PRAGMA_NAMES:
+        value = pragmas.get(name)
+        if value in (None, ""):
+            continue
+        # Pragma values can't be bound as parameters, so only allow plain tokens
+        if not re.fullmatch(r"-?[A-Za-z0-9_]+", value):
+            raise ValueError(f"Invalid value for PRAGMA {name}: {value!r}")
+        conn.execute(f"PRAGMA {name} = {value}").fetchall()
+
+
+class ConnectionPool:
     """
-    Simple OOP wrapper around SQLite operations.
-    All methods accept a SQL query string and parameters, and open/close
-    a connection per call to keep things thread-safe with FastAPI.
+    Bounded checkout/return pool of SQLite connections for one database file.
+    Connections stay open between requests so SQLite keeps its schema and
+    page cache warm instead of re-reading them on every query.
     """
 
-    def __init__(self, db_path: str = DB_PATH) -> None:
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 8,
+        timeout: float = 5.0,
+        pragmas: Optional[Dict[str, str]] = None,
+    ) -> None:
         self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.pragmas = pragmas or {}
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
 
-    def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path)
+    def _create(self) -> sqlite3.Connection:
+        # Connections are handed between threads by the pool, but only ever
+        # used by one thread at a time.
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        try:
+            apply_pragmas(conn, self.pragmas)
+        except Exception:
+            conn.close()
+            raise
         return conn
 
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    self._waits += 1
+                    create = False
+            if create:
+                try:
+                    conn = self._create()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No database connection available after {self.timeout}s"
+                    )
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    def discard(self, conn: sqlite3.Connection) -> None:
+        """Drop a connection that is in an unknown state instead of reusing it."""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._in_use -= 1
+            self._created -= 1
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            try:
+                self.release(conn)
+            except sqlite3.Error:
+                # Rollback failed, so the connection can't be trusted again
+                self.discard(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "size": self.size,
+                "timeout": self.timeout,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+            }
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = DB_PATH) -> ConnectionPool:
+    """Return the process-wide pool for db_path, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(
+                db_path,
+                size=config.DB_POOL_SIZE,
+                timeout=config.DB_POOL_TIMEOUT,
+                pragmas=pragma_profile(),
+            )
+            _pools[db_path] = pool
+        return pool
+
+
+class Database:
+    """
+    Simple OOP wrapper around SQLite operations.
+    All methods accept a SQL query string and parameters, and borrow a
+    connection from the shared pool for the duration of the call.
+    """
+
+    def __init__(self, db_path: str = DB_PATH) -> None:
+        self.db_path = db_path
+        self.pool = get_pool(db_path)
+
     # Read operations
     def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
-        conn = self._connect()
-        cur = conn.cursor()
-        cur.execute(sql, params)
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchall()
 
     def fetchall_dicts(
-        self, sql: str, params: Sequence[Any] = ()
+        self, sql: str, params: Sequence[Any] = (), table: Optional[str] = None
     ) -> List[Dict[str, Any]]:
-        return [row_to_dict(r) for r in self.fetchall(sql, params)]
+        """Rows as dicts; table selects which JSON columns get decoded."""
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            # Plain tuples are cheaper to build and feed the decoder directly
+            cur.row_factory = None
+            cur.execute(sql, params)
+            decode = row_decoder(tuple(d[0] for d in cur.description), table)
+            return [decode(r) for r in cur.fetchall()]
 
     def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[sqlite3.Row]:
-        conn = self._connect()
-        cur = conn.cursor()
-        cur.execute(sql, params)
-        row = cur.fetchone()
-        conn.close()
-        return row
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchone()
 
     def fetchone_dict(
-        self, sql: str, params: Sequence[Any] = ()
+        self, sql: str, params: Sequence[Any] = (), table: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
-        r = self.fetchone(sql, params)
-        return row_to_dict(r) if r else None
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = None
+            cur.execute(sql, params)
+            r = cur.fetchone()
+            if r is None:
+                return None
+            return row_decoder(tuple(d[0] for d in cur.description), table)(r)
 
     # Write operations
     def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
-        conn = self._connect()
-        cur = conn.cursor()
-        cur.execute(sql, params)
-        conn.commit()
-        # sqlite3 cursor.rowcount may be -1 depending on driver; use changes()
-        try:
-            count = cur.rowcount
-            if count == -1:
-                count = cur.execute("SELECT changes()").fetchone()[0]
-        except Exception:
-            count = 0
-        conn.close()
-        return count
+        with self.pool.connection() as conn:
+            cur = conn.execute(sql, params)
+            conn.commit()
+            # sqlite3 cursor.rowcount may be -1 depending on driver; use changes()
+            try:
+                count = cur.rowcount
+                if count == -1:
+                    count = conn.execute("SELECT changes()").fetchone()[0]
+            except Exception:
+                count = 0
+            return count
 
     def insert(self, sql: str, params: Sequence[Any] = ()) -> int:
-        conn = self._connect()
-        cur = conn.cursor()
-        cur.execute(sql, params)
-        conn.commit()
-        last_id = cur.lastrowid
-        conn.close()
-        return last_id
+        with self.pool.connection() as conn:
+            cur = conn.execute(sql, params)
+            conn.commit()
+            return cur.lastrowid
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run several statements on one connection and commit them together."""
+        with self.pool.connection() as conn:
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return self.pool.stats()
+
+    def effective_pragmas(self) -> Dict[str, Any]:
+        """Read back the pragma values a pooled connection is actually using."""
+        with self.pool.connection() as conn:
+            return {
+                name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in PRAGMA_NAMES
+            }
 
     # Convenience methods
     def verify_admin(self, username: str, password: str) -> bool:
@@ -81,8 +291,60 @@ class Database:
         return row is not None
 
 
-# Module-level convenience instance
+class AsyncDatabase:
+    """
+    Awaitable facade over Database for async route handlers.
+    Queries run on a dedicated executor sized to the connection pool, so
+    database work never competes with Starlette's shared threadpool and an
+    executor thread never sits waiting for a pooled connection.
+    """
+
+    def __init__(self, database: Database, max_workers: Optional[int] = None) -> None:
+        self.sync = database
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or database.pool.size,
+            thread_name_prefix="db",
+        )
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking callable on the database executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args))
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        return await self.run(self.sync.fetchall, sql, params)
+
+    async def fetchall_dicts(
+        self, sql: str, params: Sequence[Any] = (), table: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        return await self.run(self.sync.fetchall_dicts, sql, params, table)
+
+    async def fetchone(
+        self, sql: str, params: Sequence[Any] = ()
+    ) -> Optional[sqlite3.Row]:
+        return await self.run(self.sync.fetchone, sql, params)
+
+    async def fetchone_dict(
+        self, sql: str, params: Sequence[Any] = (), table: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        return await self.run(self.sync.fetchone_dict, sql, params, table)
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        return await self.run(self.sync.execute, sql, params)
+
+    async def insert(self, sql: str, params: Sequence[Any] = ()) -> int:
+        return await self.run(self.sync.insert, sql, params)
+
+    async def verify_admin(self, username: str, password: str) -> bool:
+        return await self.run(self.sync.verify_admin, username, password)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+# Module-level convenience instances
 db = Database()
+async_db = AsyncDatabase(db, max_workers=config.DB_EXECUTOR_WORKERS)
 
 
 # Initialize database
@@ -166,6 +428,21 @@ def init_db():
     """
     )
 
+    # Sessions expire; expires_at is a unix timestamp. Rows from before the
+    # column existed get created_at + SESSION_TTL_HOURS.
+    try:
+        db.execute("ALTER TABLE sessions ADD COLUMN expires_at REAL")
+    except Exception:
+        pass
+    db.execute(
+        """
+        UPDATE sessions
+        SET expires_at = CAST(strftime('%s', created_at) AS REAL) + ?
+        WHERE expires_at IS NULL
+    """,
+        (config.SESSION_TTL_HOURS * 3600,),
+    )
+
     # PI: Chatbot - Chat logs table
     db.execute(
         """
@@ -181,6 +458,18 @@ def init_db():
     """
     )
 
+    # Archived chat_logs rows live in monthly chat_logs_YYYYMM partitions
+    # (see src/chat_archive.py); this records which months hold a session
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_log_archive_sessions (
+            session_id TEXT PRIMARY KEY,
+            first_month TEXT NOT NULL,
+            last_month TEXT NOT NULL
+        )
+    """
+    )
+
     # PI: LastTrips - tables for last trips and comments
     db.execute(
         """
@@ -212,6 +501,68 @@ def init_db():
     """
     )
 
+    # Comments per trip, kept current by the comment endpoints so listings
+    # don't count them per trip. Filled from last_trip_comments once.
+    try:
+        db.execute(
+            "ALTER TABLE last_trips ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0"
+        )
+        db.execute(
+            """
+            UPDATE last_trips /* full scan */ SET comment_count = (
+                SELECT COUNT(*) FROM last_trip_comments c
+                WHERE c.trip_id = last_trips.id
+            )
+        """
+        )
+    except Exception:
+        pass
+
+    # Catalog indexes for filtered, keyset-paginated listings: equality
+    # filters first, then the sort column, then id as the tie-breaker
+    db.execute("CREATE INDEX IF NOT EXISTS idx_cars_available ON cars(available)")
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_cars_available_price ON cars(available, price_per_day, id)"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_cars_available_seats ON cars(available, seats, id)"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_cars_available_fuel_price ON cars(available, fuel_type COLLATE NOCASE, price_per_day, id)"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_cars_available_transmission_price ON cars(available, transmission COLLATE NOCASE, price_per_day, id)"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_spots_available ON picnic_spots(available)"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_spots_available_price ON picnic_spots(available, price, id)"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_spots_available_location_price ON picnic_spots(available, location COLLATE NOCASE, price, id)"
+    )
+
+    # Hot lookups outside the catalog. users.email and sessions.token are
+    # already covered by the indexes behind their UNIQUE constraints.
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chat_logs_session ON chat_logs(session_id, id)"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_last_trip_comments_trip ON last_trip_comments(trip_id, id)"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)"
+    )
+    # Expression indexes so ORDER BY datetime(created_at) reads rows in
+    # index order instead of sorting the whole table
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_last_trips_available_created ON last_trips(available, datetime(created_at))"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_last_trips_created ON last_trips(datetime(created_at))"
+    )
+
     # Insert default admin if not exists
     if not db.fetchone("SELECT 1 FROM admin WHERE username = ?", ("admin",)):
         db.execute(
@@ -220,8 +571,31 @@ def init_db():
         )
 
 
+def check_pragmas() -> Dict[str, Any]:
+    """
+    Report the effective SQLite settings at startup and flag any that differ
+    from the configured profile (e.g. WAL is unavailable on some filesystems).
+    """
+    effective = db.effective_pragmas()
+    wanted = pragma_profile()
+    print(
+        "SQLite settings: "
+        + ", ".join(f"{name}={effective[name]}" for name in PRAGMA_NAMES)
+    )
+    # Only journal_mode reads back in the same form it was set; the rest are
+    # reported as integers (e.g. synchronous=NORMAL reads back as 1).
+    wanted_mode = wanted["journal_mode"].lower()
+    if wanted_mode and str(effective["journal_mode"]).lower() != wanted_mode:
+        print(
+            f"Warning: journal_mode is {effective['journal_mode']}, "
+            f"expected {wanted_mode}"
+        )
+    return effective
+
+
 init_db()
+check_pragmas()
 
 
-def verify_admin(username: str, password: str) -> bool:
-    return db.verify_admin(username, password)
+async def verify_admin(username: str, password: str) -> bool:
+    return await async_db.verify_admin(username, password)
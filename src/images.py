@@ -0,0 +1,192 @@
+# PI: Images - resized WebP variants of catalog images
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import urlsplit
+import asyncio
+import os
+import re
+import tempfile
+
+from starlette.concurrency import run_in_threadpool
+
+from src.cache import catalog_cache
+from src.db import IMAGE_COLUMNS
+from src.utils import config
+
+# Optional: without Pillow no variants are generated and the APIs return
+# an empty image_variants map, so pages keep using the originals
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# name -> longest side in pixels; images are never upscaled
+VARIANTS = {"thumb": 160, "card": 480, "full": 1600}
+VARIANT_FORMAT = "webp"
+# <stem>.<variant>.webp next to the original
+VARIANT_NAME = re.compile(r"\.(%s)\.%s$" % ("|".join(VARIANTS), VARIANT_FORMAT))
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
+
+# images/<folder> -> catalog table whose cached responses list its images
+FOLDER_TABLES = {"cars": "cars", "spots": "picnic_spots", "last_trips": "last_trips"}
+
+ImageRows = Union[None, Dict[str, Any], List[Dict[str, Any]]]
+
+
+def local_image_path(path: str, root: str = "images") -> Optional[str]:
+    """Filesystem path for a /images/... URL (or full URL), None if outside root."""
+    local = os.path.normpath(urlsplit(path).path.lstrip("/"))
+    if local.split(os.sep)[0] != root:
+        return None
+    return local
+
+
+def is_variant(name: str) -> bool:
+    return bool(VARIANT_NAME.search(name))
+
+
+def is_resizable(path: str) -> bool:
+    name = os.path.basename(path)
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS and not is_variant(
+        name
+    )
+
+
+def variant_file(local: str, variant: str) -> str:
+    stem = os.path.splitext(local)[0]
+    return f"{stem}.{variant}.{VARIANT_FORMAT}"
+
+
+def generate_variants(local: str, force: bool = False) -> Dict[str, int]:
+    """
+    Write every missing variant of one original; returns {variant: bytes}
+    for the files written. Runs on a worker thread (Pillow releases the GIL
+    while decoding, resizing and encoding).
+    """
+    if Image is None or not is_resizable(local):
+        return {}
+    todo = [v for v in VARIANTS if force or not os.path.exists(variant_file(local, v))]
+    if not todo:
+        return {}
+    written = {}
+    try:
+        with Image.open(local) as original:
+            # JPEGs can decode straight at a reduced scale
+            largest = max(VARIANTS[v] for v in todo)
+            original.draft("RGB", (largest, largest))
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ("RGB", "RGBA"):
+                alpha = "A" in image.getbands() or "transparency" in image.info
+                image = image.convert("RGBA" if alpha else "RGB")
+            # Largest first, each variant resized from the previous one
+            for variant in sorted(todo, key=VARIANTS.get, reverse=True):
+                size = VARIANTS[variant]
+                image = image.copy()
+                image.thumbnail((size, size), Image.LANCZOS)
+                dest = variant_file(local, variant)
+                # Same temp prefix as src.uploads, so gc_images.py sweeps leftovers
+                fd, tmp_path = tempfile.mkstemp(
+                    prefix=".upload-", suffix=".tmp", dir=os.path.dirname(dest)
+                )
+                try:
+                    with os.fdopen(fd, "wb") as out:
+                        image.save(
+                            out,
+                            VARIANT_FORMAT,
+                            quality=config.IMAGE_VARIANT_QUALITY,
+                            method=4,
+                        )
+                    os.chmod(tmp_path, 0o644)
+                    os.replace(tmp_path, dest)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+                written[variant] = os.path.getsize(dest)
+    except Exception as e:
+        print(f"Could not generate variants of {local}: {e}")
+    return written
+
+
+def variant_map(path: str) -> Optional[Dict[str, str]]:
+    """{"thumb", "card", "full", "srcset"} URLs for an image whose variants exist."""
+    local = local_image_path(path)
+    if not local or not is_resizable(local):
+        return None
+    urls = {}
+    for variant in VARIANTS:
+        if not os.path.exists(variant_file(local, variant)):
+            return None
+        urls[variant] = "/" + variant_file(local, variant).replace(os.sep, "/")
+    urls["srcset"] = ", ".join(f"{urls[v]} {VARIANTS[v]}w" for v in VARIANTS)
+    return urls
+
+
+def attach_variants(rows: ImageRows, table: str) -> ImageRows:
+    if rows is None:
+        return None
+    for row in rows if isinstance(rows, list) else [rows]:
+        variants = {}
+        for column in IMAGE_COLUMNS[table]:
+            for path in row.get(column) or []:
+                if isinstance(path, str) and path not in variants:
+                    urls = variant_map(path)
+                    if urls:
+                        variants[path] = urls
+        row["image_variants"] = variants
+    return rows
+
+
+async def with_variants(rows: ImageRows, table: str) -> ImageRows:
+    """
+    Add an image_variants map ({original path: variant URLs}) to catalog
+    rows. Only images whose variants are all written appear; the rest keep
+    using the original path.
+    """
+    if Image is None or rows is None:
+        if rows is not None:
+            for row in rows if isinstance(rows, list) else [rows]:
+                row["image_variants"] = {}
+        return rows
+    return await run_in_threadpool(attach_variants, rows, table)
+
+
+class VariantWorker:
+    """
+    Background pool generating variants for new uploads. When an upload's
+    variants are written the table's cached responses are invalidated so
+    the next listing includes them.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="image-variants"
+        )
+        self.pending = 0
+
+    def submit(self, paths: List[str], folder: str) -> None:
+        """Queue variant generation for uploaded /images/<folder>/... paths."""
+        if Image is None:
+            return
+        locals_ = [p for p in map(local_image_path, paths) if p and is_resizable(p)]
+        if not locals_:
+            return
+        loop = asyncio.get_running_loop()
+        table = FOLDER_TABLES.get(folder)
+
+        def done(future: "asyncio.Future") -> None:
+            self.pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                return
+            if future.result() and table:
+                catalog_cache.invalidate(table, content=False)
+
+        for local in locals_:
+            self.pending += 1
+            future = loop.run_in_executor(self._executor, generate_variants, local)
+            future.add_done_callback(done)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+variant_worker = VariantWorker(workers=config.IMAGE_VARIANT_WORKERS)
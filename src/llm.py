@@ -0,0 +1,245 @@
+# PI: Chatbot - async OpenAI client behind a bounded concurrency limiter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, FrozenSet, List, Optional, Tuple
+import asyncio
+import re
+import threading
+
+from src.cache import TTLCache, catalog_cache
+from src.utils import config
+
+# Optional OpenAI integration; without a key or the package chat falls back
+# to the canned replies
+try:
+    from openai import AsyncOpenAI
+except ImportError:
+    AsyncOpenAI = None
+
+Messages = List[Dict[str, str]]
+
+_WORD = re.compile(r"\w+")
+
+
+class ChatSaturated(Exception):
+    """No upstream slot became free in time; use the fallback reply."""
+
+
+class ChatLimiter:
+    """
+    Caps concurrent upstream model calls. A request waits at most
+    acquire_timeout seconds for a slot and otherwise gets ChatSaturated, so
+    a burst of chat traffic degrades to canned replies instead of queueing
+    behind slow completions.
+    """
+
+    def __init__(self, max_concurrent: int, acquire_timeout: float) -> None:
+        self.max_concurrent = max_concurrent
+        self.acquire_timeout = acquire_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.saturated = 0
+        self.failed = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        try:
+            await asyncio.wait_for(
+                self._semaphore.acquire(), timeout=self.acquire_timeout
+            )
+        except asyncio.TimeoutError:
+            self.saturated += 1
+            raise ChatSaturated() from None
+        self.in_flight += 1
+        try:
+            yield
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "saturated": self.saturated,
+            "failed": self.failed,
+        }
+
+
+class ChatModel:
+    """Non-blocking chat completions, whole or streamed token by token."""
+
+    def __init__(self, limiter: ChatLimiter, timeout: float) -> None:
+        self.limiter = limiter
+        self.timeout = timeout
+        self.client = None
+        if AsyncOpenAI is not None and config.OPENAI_API_KEY:
+            self.client = AsyncOpenAI(
+                api_key=config.OPENAI_API_KEY,
+                base_url=config.OPENAI_BASE_URL or None,
+                timeout=timeout,
+                max_retries=config.OPENAI_MAX_RETRIES,
+            )
+
+    @property
+    def available(self) -> bool:
+        return self.client is not None
+
+    def _params(self, messages: Messages) -> Dict[str, Any]:
+        return {
+            "model": config.OPENAI_MODEL,
+            "messages": messages,
+            "temperature": 0.4,
+            "max_tokens": 300,
+        }
+
+    async def complete(self, messages: Messages) -> str:
+        async with self.limiter.slot():
+            resp = await asyncio.wait_for(
+                self.client.chat.completions.create(**self._params(messages)),
+                timeout=self.timeout,
+            )
+        return (resp.choices[0].message.content or "") if resp.choices else ""
+
+    async def stream(self, messages: Messages) -> AsyncIterator[str]:
+        """
+        Yield reply text as the model produces it. The slot is held until
+        the stream ends; the whole reply must arrive within the timeout.
+        """
+        async with self.limiter.slot():
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.timeout
+            stream = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    **self._params(messages), stream=True
+                ),
+                timeout=self.timeout,
+            )
+            try:
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        chunk = await asyncio.wait_for(
+                            stream.__anext__(), timeout=remaining
+                        )
+                    except StopAsyncIteration:
+                        break
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+
+
+def normalize_prompt(text: str) -> str:
+    """Lower-cased words only, so case, punctuation and spacing don't matter."""
+    return " ".join(_WORD.findall(text.lower()))
+
+
+class ReplyCache:
+    """
+    Model replies keyed on the normalized prompt plus the previous user
+    message of the conversation (the context the reply depends on most).
+    Exact keys are looked up first; with a similarity threshold above 0, a
+    prompt whose word set overlaps a cached one's by at least that Jaccard
+    ratio (same context) reuses its reply too. Entries expire after ttl
+    seconds, the least recently used go first, and everything is dropped
+    whenever catalog rows change since replies quote prices and listings.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, similarity: float) -> None:
+        self.similarity = similarity
+        # (context, prompt) -> (reply, prompt words, upstream seconds)
+        self._entries = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.avoided_seconds = 0.0
+
+    @staticmethod
+    def _key(messages: Messages) -> Tuple[str, str]:
+        users = [m["content"] for m in messages if m["role"] == "user"]
+        context = normalize_prompt(users[-2]) if len(users) > 1 else ""
+        return context, normalize_prompt(users[-1]) if users else ""
+
+    def _similar(
+        self, context: str, words: FrozenSet[str]
+    ) -> Optional[Tuple[Tuple[str, str], Any]]:
+        best, best_score = None, self.similarity
+        for key, entry in self._entries.items():
+            if key[0] != context or not words:
+                continue
+            score = len(words & entry[1]) / len(words | entry[1])
+            if score >= best_score:
+                best, best_score = (key, entry), score
+        return best
+
+    def get(self, messages: Messages) -> Optional[str]:
+        context, prompt = key = self._key(messages)
+        entry = self._entries.get(key)
+        kind = "exact"
+        if entry is None and self.similarity > 0:
+            found = self._similar(context, frozenset(prompt.split()))
+            if found is not None:
+                kind = "similar"
+                # Refresh its LRU position
+                entry = self._entries.get(found[0]) or found[1]
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if kind == "exact":
+                self.exact_hits += 1
+            else:
+                self.similar_hits += 1
+            self.avoided_seconds += entry[2]
+        return entry[0]
+
+    def put(
+        self, messages: Messages, reply: str, seconds: float, generation: int
+    ) -> None:
+        """Store a reply unless the catalog changed while it was generated."""
+        key = self._key(messages)
+        with self._lock:
+            if generation == self.generation and key[1]:
+                self._entries.set(key, (reply, frozenset(key[1].split()), seconds))
+
+    def clear(self, *_: Any) -> None:
+        """Drop every reply; also a catalog_cache listener."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "avoided_upstream_seconds": round(self.avoided_seconds, 3),
+            }
+
+
+chat_model = ChatModel(
+    limiter=ChatLimiter(
+        max_concurrent=config.OPENAI_MAX_CONCURRENCY,
+        acquire_timeout=config.OPENAI_QUEUE_TIMEOUT_SECONDS,
+    ),
+    timeout=config.OPENAI_TIMEOUT_SECONDS,
+)
+
+reply_cache = ReplyCache(
+    max_entries=config.CHAT_CACHE_MAX_ENTRIES,
+    ttl=config.CHAT_CACHE_TTL_SECONDS,
+    similarity=config.CHAT_CACHE_SIMILARITY,
+)
+catalog_cache.subscribe(reply_cache.clear, content_only=True)
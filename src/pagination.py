@@ -0,0 +1,113 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import base64
+import json
+import re
+
+from fastapi import HTTPException
+
+from src.db_ops import AsyncDatabase
+
+# A "<column> <op> ?" range filter
+RANGE_FILTER = re.compile(r"(\w+) ([<>]=?) \?")
+
+# Types a sort value can have in a cursor (bool is an int but never a value)
+CURSOR_VALUE_TYPES = (str, int, float)
+
+
+def encode_cursor(sort: str, value: Any, row_id: int) -> str:
+    raw = json.dumps([sort, value, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """Return the (sort value, id) a cursor points after; 400 if it's invalid."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if (
+            cursor_sort != sort
+            or not isinstance(row_id, int)
+            or not isinstance(value, CURSOR_VALUE_TYPES)
+            or isinstance(value, bool)
+            or isinstance(row_id, bool)
+        ):
+            raise ValueError(cursor_sort)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, row_id
+
+
+def unindexed_range(clause: str, column: str) -> str:
+    """clause with a unary + if it is a range filter on another column."""
+    match = RANGE_FILTER.fullmatch(clause)
+    if match and match.group(1) != column:
+        return f"+{clause}"
+    return clause
+
+
+def build_page_query(
+    table: str,
+    where: List[str],
+    params: Sequence[Any],
+    sort: str,
+    order: Tuple[str, bool],
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[str, List[Any]]:
+    """
+    SQL and parameters for one keyset page (limit + 1 rows) of table.
+
+    order is (column, descending); id breaks ties so pages never overlap or
+    skip rows, and the (column, id) row-value comparison lets SQLite seek
+    straight to the cursor position in a matching index. Range filters on
+    other columns are kept off the indexes (unary +) so SQLite walks the
+    sort column's index and stops after limit + 1 rows, rather than
+    sorting every matching row in a temporary b-tree.
+    """
+    column, descending = order
+    where = [unindexed_range(clause, column) for clause in where]
+    params = list(params)
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort)
+        # With the sort column pinned by an equality filter, id alone orders
+        # the page
+        if column == "id" or f"{column} = ?" in where:
+            where.append("id < ?" if descending else "id > ?")
+            params.append(row_id)
+        else:
+            where.append(f"({column}, id) {'<' if descending else '>'} (?, ?)")
+            params.extend([value, row_id])
+
+    direction = "DESC" if descending else "ASC"
+    order_by = f"id {direction}"
+    if column != "id":
+        order_by = f"{column} {direction}, {order_by}"
+    sql = f"SELECT * FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order_by} LIMIT ?"
+    # One extra row tells us whether there is a next page
+    return sql, params + [limit + 1]
+
+
+async def fetch_page(
+    db: AsyncDatabase,
+    table: str,
+    where: List[str],
+    params: Sequence[Any],
+    sort: str,
+    order: Tuple[str, bool],
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fetch one keyset page; returns (rows, next_cursor or None)."""
+    sql, sql_params = build_page_query(table, where, params, sort, order, limit, cursor)
+    rows = await db.fetchall_dicts(sql, sql_params, table=table)
+
+    column = order[0]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, last[column], last["id"])
+    return rows, next_cursor
@@ -0,0 +1,84 @@
+# PI: UserAuth - bcrypt hashing on a dedicated, bounded worker pool
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+import asyncio
+import threading
+
+import bcrypt
+from fastapi import HTTPException
+
+from src.utils import config
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on its own small thread pool. bcrypt releases the GIL while
+    hashing, so the threads hash in parallel without a process pool's
+    start-up and pickling cost, and slow hashes never occupy the threads
+    used by other routes. When more than max_pending hashes are queued or
+    running, new requests get a 429 instead of waiting in line.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many login attempts in progress, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(fn, *args))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        hashed = await self._run(bcrypt.hashpw, password.encode("utf-8"), salt)
+        return hashed.decode("utf-8")
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(
+            bcrypt.checkpw, password.encode("utf-8"), password_hash.encode("utf-8")
+        )
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True if the hash was made with a different cost than configured."""
+        # Format: $2b$<cost>$<salt+hash>
+        try:
+            return int(password_hash.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "rejected": self._rejected,
+                "rounds": self.rounds,
+            }
+
+
+hasher = PasswordHasher(
+    workers=config.PASSWORD_HASH_WORKERS,
+    max_pending=config.PASSWORD_HASH_MAX_PENDING,
+    rounds=config.BCRYPT_ROUNDS,
+)
@@ -0,0 +1,347 @@
+# PI: RateLimit - token buckets for public write endpoints
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern, Tuple
+import json
+import math
+import re
+import threading
+import time
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from src.utils import config
+
+# Optional: share buckets between worker processes through Redis (or any
+# server speaking its protocol, e.g. Valkey or KeyDB)
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+# Request bodies are only read for a client id up to this size
+MAX_PEEK_BYTES = 64 * 1024
+
+
+class Bucket(NamedTuple):
+    key: str
+    capacity: float
+    # Tokens added per second
+    rate: float
+
+
+class Rule(NamedTuple):
+    name: str
+    method: str
+    path: Pattern[str]
+    capacity: float
+    # Tokens added per second
+    rate: float
+    # Whether the JSON body's token/session_id identifies the client
+    by_session: bool
+
+
+def parse_rate(value: str) -> Tuple[float, float]:
+    """(capacity, tokens per second) of a "<requests>/<seconds>" setting."""
+    try:
+        count, _, seconds = value.partition("/")
+        capacity, period = float(count), float(seconds or "1")
+        if capacity <= 0 or period <= 0:
+            raise ValueError(value)
+    except ValueError:
+        raise ValueError(f"Invalid rate limit {value!r}, expected <requests>/<seconds>")
+    return capacity, capacity / period
+
+
+def default_rules() -> List[Rule]:
+    """The public endpoints that write a row (and, for chat, call the model)."""
+    rules = [
+        ("chat", r"/api/chat(/stream)?", config.RATE_LIMIT_CHAT, True),
+        ("chat_plan", r"/api/chat/plan", config.RATE_LIMIT_CHAT_PLAN, True),
+        (
+            "comments",
+            r"/api/last_trips/\d+/comments",
+            config.RATE_LIMIT_COMMENTS,
+            False,
+        ),
+        ("register", r"/api/users/register", config.RATE_LIMIT_REGISTER, False),
+    ]
+    return [
+        Rule(name, "POST", re.compile(path), *parse_rate(rate), by_session)
+        for name, path, rate, by_session in rules
+    ]
+
+
+class MemoryBackend:
+    """
+    Token buckets in an LRU-ordered dict: O(1) per request and at most
+    max_keys buckets. An evicted bucket comes back full, which only errs
+    towards letting a request through; buckets idle long enough to refill
+    are the same as absent ones anyway. Per process, so with several
+    workers each enforces its own share of the limit.
+    """
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        # key -> [tokens, updated at]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _refill(self, bucket: Bucket, now: float) -> List[float]:
+        state = self._buckets.get(bucket.key)
+        if state is None:
+            state = self._buckets[bucket.key] = [bucket.capacity, now]
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._buckets.move_to_end(bucket.key)
+            state[0] = min(bucket.capacity, state[0] + (now - state[1]) * bucket.rate)
+            state[1] = now
+        return state
+
+    async def take(self, buckets: List[Bucket]) -> float:
+        """
+        Take one token from every bucket if each has one; returns 0 then,
+        else the seconds until they all will (nothing is taken from any).
+        """
+        now = time.monotonic()
+        with self._lock:
+            states = [self._refill(bucket, now) for bucket in buckets]
+            wait = max(
+                (1 - state[0]) / bucket.rate for bucket, state in zip(buckets, states)
+            )
+            if wait > 0:
+                return wait
+            for state in states:
+                state[0] -= 1
+            return 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "keys": len(self._buckets),
+                "max_keys": self.max_keys,
+                "evictions": self.evictions,
+            }
+
+
+# Same bucket arithmetic as MemoryBackend, run atomically inside Redis:
+# ARGV is now then capacity, rate for each key. Keys expire once a bucket
+# would be full again.
+TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local t = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    t = math.min(capacity, t + math.max(0, now - updated) * rate)
+    wait = math.max(wait, (1 - t) / rate)
+    tokens[i] = t
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    if wait <= 0 then
+        tokens[i] = tokens[i] - 1
+    end
+    redis.call('HSET', key, 'tokens', tokens[i], 'updated', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return tostring(math.max(wait, 0))
+"""
+
+
+class RedisBackend:
+    """
+    Buckets shared by every worker through a Redis-compatible server. If
+    the server can't be reached requests are let through (and counted),
+    so an outage of the limiter never takes the site down with it.
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:") -> None:
+        if aioredis is None:
+            raise RuntimeError(
+                "RATE_LIMIT_REDIS_URL is set but the redis package is not installed"
+            )
+        self.client = aioredis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(TAKE_SCRIPT)
+        self.errors = 0
+
+    async def take(self, buckets: List[Bucket]) -> float:
+        args: List[float] = [time.time()]
+        for bucket in buckets:
+            args += [bucket.capacity, bucket.rate]
+        try:
+            wait = await self._take(
+                keys=[self.prefix + bucket.key for bucket in buckets], args=args
+            )
+        except Exception as e:
+            self.errors += 1
+            print(f"Rate limit backend unavailable, allowing request: {e!r}")
+            return 0.0
+        return float(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "errors": self.errors}
+
+
+def client_ip(scope, trust_proxy: bool) -> str:
+    if trust_proxy:
+        forwarded = Headers(scope=scope).get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def session_key(body: bytes) -> Optional[str]:
+    """The login token, else the chat session id, of a JSON request body."""
+    try:
+        data = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    for field in ("token", "session_id"):
+        value = data.get(field)
+        if isinstance(value, str) and value:
+            return f"{field}:{value}"
+    return None
+
+
+class RateLimiter:
+    """
+    Per-client token buckets for each rule. A client is its login token or
+    chat session when the request names one, with every such client on an
+    IP together allowed ip_factor times one client's rate (so rotating
+    session ids doesn't escape the limit); otherwise it is the IP itself.
+    The shared allowance has its own bucket, apart from the IP's own, and
+    a request takes from its buckets only if all of them have a token.
+    """
+
+    def __init__(self, rules: List[Rule], backend, ip_factor: float) -> None:
+        self.rules = rules
+        self.backend = backend
+        self.ip_factor = ip_factor
+        self.allowed: Dict[str, int] = {rule.name: 0 for rule in rules}
+        self.limited: Dict[str, int] = {rule.name: 0 for rule in rules}
+
+    def match(self, method: str, path: str) -> Optional[Rule]:
+        for rule in self.rules:
+            if rule.method == method and rule.path.fullmatch(path):
+                return rule
+        return None
+
+    async def check(self, rule: Rule, ip: str, session: Optional[str]) -> float:
+        """0 if the request may go ahead, else seconds until it may."""
+        if session is None:
+            buckets = [Bucket(f"{rule.name}:ip:{ip}", rule.capacity, rule.rate)]
+        else:
+            factor = self.ip_factor
+            buckets = [
+                Bucket(f"{rule.name}:{session}", rule.capacity, rule.rate),
+                Bucket(
+                    f"{rule.name}:ip-shared:{ip}",
+                    rule.capacity * factor,
+                    rule.rate * factor,
+                ),
+            ]
+        wait = await self.backend.take(buckets)
+        if wait:
+            self.limited[rule.name] += 1
+        else:
+            self.allowed[rule.name] += 1
+        return wait
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rules": {
+                rule.name: {
+                    "capacity": rule.capacity,
+                    "per_second": round(rule.rate, 4),
+                    "allowed": self.allowed[rule.name],
+                    "limited": self.limited[rule.name],
+                }
+                for rule in self.rules
+            },
+            **self.backend.stats(),
+        }
+
+
+class RateLimitMiddleware:
+    """
+    Answers 429 with Retry-After once a client has used up its bucket for
+    a rate-limited route, before the route reads the database or calls the
+    model. Other requests pass straight through.
+    """
+
+    def __init__(self, app, limiter: RateLimiter, trust_proxy: bool) -> None:
+        self.app = app
+        self.limiter = limiter
+        self.trust_proxy = trust_proxy
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rule = self.limiter.match(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        session = None
+        app_receive = receive
+        if rule.by_session:
+            # Read the (small) JSON body for its token/session_id, then
+            # hand the same messages to the route
+            messages = []
+            body = b""
+            while True:
+                message = await receive()
+                messages.append(message)
+                if message["type"] != "http.request":
+                    break
+                body += message.get("body", b"")
+                if not message.get("more_body") or len(body) > MAX_PEEK_BYTES:
+                    break
+            if len(body) <= MAX_PEEK_BYTES:
+                session = session_key(body)
+
+            async def replay():
+                if messages:
+                    return messages.pop(0)
+                return await receive()
+
+            app_receive = replay
+
+        wait = await self.limiter.check(
+            rule, client_ip(scope, self.trust_proxy), session
+        )
+        if wait:
+            response = JSONResponse(
+                {"detail": "Too many requests, please slow down"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+            await response(scope, app_receive, send)
+            return
+        await self.app(scope, app_receive, send)
+
+
+def make_backend():
+    if config.RATE_LIMIT_REDIS_URL:
+        return RedisBackend(config.RATE_LIMIT_REDIS_URL)
+    return MemoryBackend(max_keys=config.RATE_LIMIT_MAX_KEYS)
+
+
+rate_limiter = RateLimiter(
+    default_rules(), make_backend(), ip_factor=config.RATE_LIMIT_IP_FACTOR
+)
@@ -0,0 +1,412 @@
+# PI: Chatbot - in-memory BM25 retrieval index over the catalog
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import math
+import re
+import threading
+
+from src.cache import catalog_cache
+from src.db_ops import AsyncDatabase, Database, async_db
+
+DocKey = Tuple[str, int]
+
+# Available rows of each catalog table, as indexed. Rebuilding reads the
+# whole catalog once at startup; admin writes reload single rows by id.
+CATALOG_SQL = {
+    "cars": """
+        SELECT id, name, model, price_per_day, seats, transmission, fuel_type,
+               description
+        FROM cars WHERE available = 1
+    """,
+    "picnic_spots": """
+        SELECT id, name, price, location, short_description, detailed_description
+        FROM picnic_spots WHERE available = 1
+    """,
+    "last_trips": """
+        SELECT id, destination, spots, days, persons, feedback
+        FROM last_trips WHERE available = 1
+    """,
+}
+ROW_SQL = {
+    "cars": """
+        SELECT id, name, model, price_per_day, seats, transmission, fuel_type,
+               description
+        FROM cars WHERE id = ? AND available = 1
+    """,
+    "picnic_spots": """
+        SELECT id, name, price, location, short_description, detailed_description
+        FROM picnic_spots WHERE id = ? AND available = 1
+    """,
+    "last_trips": """
+        SELECT id, destination, spots, days, persons, feedback
+        FROM last_trips WHERE id = ? AND available = 1
+    """,
+}
+
+_WORD = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from have i in is it me my of on or "
+    "show tell the to under us we what which with you your".split()
+)
+FUEL_TYPES = ("petrol", "diesel", "electric", "cng", "hybrid")
+TRANSMISSIONS = ("automatic", "manual")
+SEATS = re.compile(r"\b(\d{1,2})\s*-?\s*(?:seater|seats?|persons?|people)\b")
+MAX_PRICE = re.compile(
+    r"\b(?:under|below|less than|within|upto|up to|max(?:imum)?)\s*(?:rs\.?|inr|₹)?\s*(\d[\d,]*)"
+)
+CHEAPEST = re.compile(r"\b(cheap|cheapest|lowest|budget|affordable|least)\b")
+# Tokens (see tokenize) that make a question about cars, or about one of
+# the other catalog tables
+CAR_TERMS = frozenset(
+    "car vehicle suv sedan hatchback seater mpv rental".split()
+    + list(FUEL_TYPES)
+    + list(TRANSMISSIONS)
+)
+OTHER_TERMS = frozenset(
+    "spot picnic destination place trip tour beach visit travel".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words without stopwords; a plural "s" is dropped."""
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _spot_names(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return [
+            s
+            if isinstance(s, str)
+            else str(s.get("name", ""))
+            if isinstance(s, dict)
+            else ""
+            for s in value
+        ]
+    return [str(value or "")]
+
+
+def document(table: str, row: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """(searchable text, structured attributes) of one catalog row."""
+    if table == "cars":
+        text = " ".join(
+            str(row.get(k) or "")
+            for k in ("name", "model", "transmission", "fuel_type", "description")
+        )
+        text += f" {row['seats']} seater car"
+        attrs = {
+            "name": f"{row['name']} {row['model']}".strip(),
+            "price": row["price_per_day"],
+            "seats": row["seats"],
+            "fuel_type": (row.get("fuel_type") or "").lower(),
+            "transmission": (row.get("transmission") or "").lower(),
+        }
+    elif table == "picnic_spots":
+        text = " ".join(
+            str(row.get(k) or "")
+            for k in ("name", "location", "short_description", "detailed_description")
+        )
+        text += " spot destination picnic"
+        attrs = {
+            "name": row["name"],
+            "price": row["price"],
+            "location": row.get("location") or "",
+        }
+    else:
+        spots = _spot_names(row.get("spots"))
+        text = " ".join(
+            [row.get("destination") or "", *spots, row.get("feedback") or ""]
+        )
+        text += " trip past"
+        attrs = {
+            "name": row.get("destination") or "",
+            "days": row.get("days"),
+            "persons": row.get("persons"),
+            "spots": [s for s in spots if s],
+        }
+    return text, attrs
+
+
+class Hit(NamedTuple):
+    table: str
+    id: int
+    score: float
+    attrs: Dict[str, Any]
+
+
+def describe(hit: Hit) -> str:
+    """One line about a hit, for prompts and offline answers."""
+    a = hit.attrs
+    if hit.table == "cars":
+        return (
+            f"Car: {a['name']} - {a['seats']} seats, {a['fuel_type']}, "
+            f"{a['transmission']}, ₹{a['price']:g}/day (/car-detail.html?id={hit.id})"
+        )
+    if hit.table == "picnic_spots":
+        return (
+            f"Destination: {a['name']}, {a['location']} - from ₹{a['price']:g} "
+            f"(/spot-detail.html?id={hit.id})"
+        )
+    spots = ", ".join(a["spots"][:5])
+    return (
+        f"Past trip: {a['name']} - {a['days']} days, {a['persons']} persons"
+        + (f", visited {spots}" if spots else "")
+        + f" (/last-trip-detail.html?id={hit.id})"
+    )
+
+
+class CatalogIndex:
+    """
+    BM25 over the text of available cars, picnic spots and last trips.
+
+    Kept as an inverted index (term -> {doc: term frequency}) so a change
+    to one row only touches that row's postings. Built at startup; the
+    catalog_cache listener reloads rows as admins edit them.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[DocKey, int]] = {}
+        self._lengths: Dict[DocKey, int] = {}
+        self._terms: Dict[DocKey, Tuple[str, ...]] = {}
+        self._attrs: Dict[DocKey, Dict[str, Any]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def _remove(self, key: DocKey) -> None:
+        length = self._lengths.pop(key, None)
+        if length is None:
+            return
+        self._total_length -= length
+        self._attrs.pop(key, None)
+        for term in self._terms.pop(key, ()):
+            docs = self._postings[term]
+            del docs[key]
+            if not docs:
+                del self._postings[term]
+
+    def _add(self, table: str, row: Dict[str, Any]) -> None:
+        key = (table, row["id"])
+        text, attrs = document(table, row)
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[key] = tf
+        length = sum(terms.values())
+        self._terms[key] = tuple(terms)
+        self._lengths[key] = length
+        self._total_length += length
+        self._attrs[key] = attrs
+
+    def build(self, database: Database) -> int:
+        """(Re)index every available catalog row; returns the document count."""
+        rows = {
+            table: database.fetchall_dicts(sql, table=table)
+            for table, sql in CATALOG_SQL.items()
+        }
+        with self._lock:
+            self._postings, self._lengths, self._terms, self._attrs = {}, {}, {}, {}
+            self._total_length = 0
+            for table, table_rows in rows.items():
+                for row in table_rows:
+                    self._add(table, row)
+            self.ready = True
+            return len(self._lengths)
+
+    def reload(
+        self, database: Database, table: str, row_id: Optional[int] = None
+    ) -> None:
+        """Re-read one row (or a whole table when row_id is None)."""
+        if table not in CATALOG_SQL:
+            return
+        if row_id is None:
+            rows = database.fetchall_dicts(CATALOG_SQL[table], table=table)
+        else:
+            rows = database.fetchall_dicts(ROW_SQL[table], (row_id,), table=table)
+        with self._lock:
+            stale = [k for k in self._lengths if k[0] == table]
+            for key in stale if row_id is None else [(table, row_id)]:
+                self._remove(key)
+            for row in rows:
+                self._add(table, row)
+
+    def search(self, query: str, k: int = 5, table: Optional[str] = None) -> List[Hit]:
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._lengths)
+            if not n or not terms:
+                return []
+            avgdl = self._total_length / n
+            scores: Dict[DocKey, float] = {}
+            for term in terms:
+                docs = self._postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for key, tf in docs.items():
+                    if table and key[0] != table:
+                        continue
+                    norm = tf + self.k1 * (
+                        1 - self.b + self.b * self._lengths[key] / avgdl
+                    )
+                    scores[key] = scores.get(key, 0.0) + idf * tf * (self.k1 + 1) / norm
+            best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+            return [Hit(key[0], key[1], score, self._attrs[key]) for key, score in best]
+
+    def cars(self) -> List[Hit]:
+        with self._lock:
+            return [
+                Hit(key[0], key[1], 0.0, attrs)
+                for key, attrs in self._attrs.items()
+                if key[0] == "cars"
+            ]
+
+
+def parse_car_filters(query: str) -> Dict[str, Any]:
+    """Structured constraints in a car question (seats, fuel, gearbox, price)."""
+    text = query.lower()
+    filters: Dict[str, Any] = {}
+    match = SEATS.search(text)
+    if match:
+        filters["seats"] = int(match.group(1))
+    for fuel in FUEL_TYPES:
+        if re.search(rf"\b{fuel}\b", text):
+            filters["fuel_type"] = fuel
+    for transmission in TRANSMISSIONS:
+        if re.search(rf"\b{transmission}\b", text):
+            filters["transmission"] = transmission
+    match = MAX_PRICE.search(text)
+    if match:
+        filters["max_price"] = float(match.group(1).replace(",", ""))
+    if CHEAPEST.search(text):
+        filters["cheapest"] = True
+    return filters
+
+
+def is_car_query(query: str) -> bool:
+    """Whether a question names cars (or a car attribute) and nothing else."""
+    terms = set(tokenize(query))
+    return bool(terms & CAR_TERMS) and not terms & OTHER_TERMS
+
+
+def structured_car_answer(
+    index: CatalogIndex, query: str, k: int
+) -> Optional[List[Hit]]:
+    """
+    Cars matching the question's constraints, cheapest first; None when the
+    question isn't about cars or has no car constraints (so BM25 ranking
+    applies instead).
+    """
+    if not is_car_query(query):
+        return None
+    filters = parse_car_filters(query)
+    if not filters:
+        return None
+    hits = []
+    for hit in index.cars():
+        a = hit.attrs
+        if "seats" in filters and a["seats"] < filters["seats"]:
+            continue
+        if "fuel_type" in filters and a["fuel_type"] != filters["fuel_type"]:
+            continue
+        if "transmission" in filters and a["transmission"] != filters["transmission"]:
+            continue
+        if "max_price" in filters and a["price"] > filters["max_price"]:
+            continue
+        hits.append(hit)
+    # Exact seat counts before larger cars, then by price
+    seats = filters.get("seats")
+    hits.sort(
+        key=lambda h: (
+            seats is not None and h.attrs["seats"] != seats,
+            h.attrs["price"],
+        )
+    )
+    return hits[:k]
+
+
+# Share of the best BM25 score a hit needs to be reordered by constraints
+RELEVANT_SCORE = 0.75
+
+
+def rank_hits(hits: List[Hit], filters: Dict[str, Any], k: int) -> List[Hit]:
+    """
+    BM25 hits narrowed to the best hit's table and to those scoring close
+    to it, then ordered by the question's "cheapest" and party size
+    constraints where that table has the attribute.
+    """
+    if not hits:
+        return hits
+    best = hits[0]
+    hits = [
+        hit
+        for hit in hits
+        if hit.table == best.table and hit.score >= best.score * RELEVANT_SCORE
+    ]
+    size = filters.get("seats")
+    if size is not None and "persons" in hits[0].attrs:
+        # Trips for at least that many people first
+        hits.sort(key=lambda h: (h.attrs["persons"] or 0) < size)
+    if filters.get("cheapest") and "price" in hits[0].attrs:
+        hits.sort(key=lambda h: h.attrs["price"])
+    return hits[:k]
+
+
+def retrieve(index: CatalogIndex, query: str, k: int) -> List[Hit]:
+    """Top-k catalog rows for a question: filtered cars, else BM25."""
+    cars = structured_car_answer(index, query, k)
+    if cars:
+        return cars
+    # A wider pool so filtering and reordering don't run short of hits
+    hits = index.search(query, k * 4)
+    terms = set(tokenize(query))
+    if terms & OTHER_TERMS and not terms & CAR_TERMS:
+        # "for 4 people" shouldn't pull in 4-seater cars
+        hits = [hit for hit in hits if hit.table != "cars"]
+    filters = parse_car_filters(query)
+    if not filters:
+        return hits[:k]
+    return rank_hits(hits, filters, k)
+
+
+class IndexUpdater:
+    """catalog_cache listener reloading changed rows off the event loop."""
+
+    def __init__(self, index: CatalogIndex, db: AsyncDatabase) -> None:
+        self.index = index
+        self.db = db
+        self._tasks: set = set()
+
+    def __call__(self, table: str, row_id: Optional[int]) -> None:
+        if not self.index.ready or table not in CATALOG_SQL:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside the server (scripts): reload inline
+            self.index.reload(self.db.sync, table, row_id)
+            return
+        task = loop.create_task(self._reload(table, row_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _reload(self, table: str, row_id: Optional[int]) -> None:
+        try:
+            await self.db.run(self.index.reload, self.db.sync, table, row_id)
+        except Exception as e:
+            print(f"Could not reindex {table} {row_id}: {e}")
+
+
+catalog_index = CatalogIndex()
+catalog_cache.subscribe(IndexUpdater(catalog_index, async_db), content_only=True)
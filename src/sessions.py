@@ -0,0 +1,96 @@
+# PI: UserAuth - cached session token lookups, expiry and stale-session sweep
+from typing import Any, Dict, Optional
+import asyncio
+import time
+
+from src.cache import TTLCache
+from src.db_ops import async_db as db
+from src.utils import config
+
+# token -> user record for recently seen sessions. Entries live at most
+# SESSION_CACHE_TTL_SECONDS, which bounds how long a logout made on another
+# worker process can go unnoticed here.
+session_cache = TTLCache(
+    max_entries=config.SESSION_CACHE_MAX_ENTRIES,
+    ttl=config.SESSION_CACHE_TTL_SECONDS,
+)
+
+
+def session_expiry(now: Optional[float] = None) -> float:
+    """Unix timestamp at which a session created now stops being valid."""
+    return (now or time.time()) + config.SESSION_TTL_HOURS * 3600
+
+
+async def resolve_session(token: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Return {"email", "full_name", "created_at"} for a live session token,
+    or None if the token is unknown or expired.
+    """
+    if not token:
+        return None
+    now = time.time()
+    cached = session_cache.get(token)
+    if cached is not None:
+        if cached["expires_at"] > now:
+            return cached["user"]
+        session_cache.pop(token)
+        return None
+
+    row = await db.fetchone(
+        """
+        SELECT s.user_email, s.expires_at, u.full_name, u.created_at
+        FROM sessions s LEFT JOIN users u ON u.email = s.user_email
+        WHERE s.token = ?
+        """,
+        (token,),
+    )
+    if not row or row["expires_at"] is None or row["expires_at"] <= now:
+        return None
+    user = {
+        "full_name": row["full_name"],
+        "email": row["user_email"],
+        "created_at": row["created_at"],
+    }
+    session_cache.set(
+        token,
+        {"user": user, "expires_at": row["expires_at"]},
+        ttl=min(config.SESSION_CACHE_TTL_SECONDS, row["expires_at"] - now),
+    )
+    return user
+
+
+async def end_session(token: str) -> None:
+    session_cache.pop(token)
+    await db.execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+
+async def sweep_expired_sessions(batch_size: int = 1000) -> int:
+    """Delete expired sessions in small batches so writers never wait long."""
+    now = time.time()
+    removed = 0
+    while True:
+        count = await db.execute(
+            """
+            DELETE FROM sessions WHERE id IN (
+                SELECT id FROM sessions WHERE expires_at <= ? LIMIT ?
+            )
+            """,
+            (now, batch_size),
+        )
+        removed += count
+        if count < batch_size:
+            break
+    session_cache.purge_expired()
+    return removed
+
+
+async def session_sweeper() -> None:
+    """Background task purging expired sessions every sweep interval."""
+    while True:
+        await asyncio.sleep(config.SESSION_SWEEP_INTERVAL_SECONDS)
+        try:
+            removed = await sweep_expired_sessions()
+            if removed:
+                print(f"Purged {removed} expired sessions")
+        except Exception as e:
+            print(f"Session sweep failed: {e}")
@@ -0,0 +1,186 @@
+# PI: Static - fingerprinted, precompressed assets and prerendered pages
+from typing import Callable, Dict, Optional
+import hashlib
+import mimetypes
+import os
+import re
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from src.cache import etag_matches
+from src.compression import negotiate_encoding, precompress
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+# Files the static layer fingerprints; HTML files without an <html> tag are
+# fragments (nav.html) and get inlined into pages rather than served alone
+ASSET_EXTENSIONS = {".js", ".css", ".html"}
+ASSET_REF = re.compile(r'((?:src|href)=")/public/([^"?#]+)(")')
+NAV_PLACEHOLDER = '<div id="nav-placeholder"></div>'
+
+# Uploads named by their sha256 (and variants of them) never change
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}\.")
+
+
+class Asset:
+    """One in-memory file with its compressed encodings and validators."""
+
+    def __init__(
+        self,
+        body: bytes,
+        media_type: str,
+        cache_control: str,
+        precompressed: Optional[Dict[str, bytes]] = None,
+    ) -> None:
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.bodies = precompress(body)
+        # Files compressed at build time win over our own encodings
+        for encoding, data in (precompressed or {}).items():
+            if len(data) < len(body):
+                self.bodies[encoding] = data
+
+    def etag_for(self, encoding: str) -> str:
+        # Each encoding is a different representation, so gets its own ETag
+        tag = self.digest[:16]
+        return f'"{tag}"' if encoding == "identity" else f'"{tag}-{encoding}"'
+
+    def response(self, request: Request) -> Response:
+        encoding = negotiate_encoding(
+            request.headers.get("accept-encoding"), self.bodies
+        )
+        headers = {
+            "ETag": self.etag_for(encoding),
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and etag_matches(
+            if_none_match, map(self.etag_for, self.bodies)
+        ):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(
+            self.bodies[encoding], media_type=self.media_type, headers=headers
+        )
+
+
+class StaticAssets:
+    """
+    Loads public/ at startup. JS, CSS and HTML fragments are fingerprinted
+    and served from /static/<name>.<hash><ext> with an immutable
+    Cache-Control; pages are prerendered with those URLs and the shared nav
+    inlined, and revalidate with an ETag. Everything is kept gzip- and (if
+    available) brotli-compressed, preferring .gz/.br files found on disk.
+    """
+
+    def __init__(
+        self, directory: str, url_prefix: str = "/static", auto_reload: bool = False
+    ) -> None:
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.auto_reload = auto_reload
+        self.urls: Dict[str, str] = {}  # source name -> fingerprinted URL
+        self.assets: Dict[str, Asset] = {}  # fingerprinted file name -> asset
+        self.pages: Dict[str, Asset] = {}  # page name -> prerendered page
+        self._mtime = 0.0
+
+    def _read(self, name: str) -> bytes:
+        with open(os.path.join(self.directory, name), "rb") as f:
+            return f.read()
+
+    def _precompressed(self, name: str) -> Dict[str, bytes]:
+        found = {}
+        for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+            path = os.path.join(self.directory, name + suffix)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    found[encoding] = f.read()
+        return found
+
+    def _latest_mtime(self) -> float:
+        return max(
+            (e.stat().st_mtime for e in os.scandir(self.directory) if e.is_file()),
+            default=0.0,
+        )
+
+    def load(self) -> None:
+        urls, assets, pages, fragments, page_sources = {}, {}, {}, {}, {}
+        for name in sorted(os.listdir(self.directory)):
+            stem, ext = os.path.splitext(name)
+            if ext not in ASSET_EXTENSIONS:
+                continue
+            body = self._read(name)
+            if ext == ".html" and b"<html" in body.lower():
+                page_sources[name] = body.decode("utf-8")
+                continue
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            asset = Asset(body, media_type, IMMUTABLE, self._precompressed(name))
+            fingerprinted = f"{stem}.{asset.digest[:10]}{ext}"
+            urls[name] = f"{self.url_prefix}/{fingerprinted}"
+            assets[fingerprinted] = asset
+            if ext == ".html":
+                fragments[name] = body.decode("utf-8")
+
+        def fingerprint(match: "re.Match") -> str:
+            url = urls.get(match.group(2))
+            return match.group(1) + url + match.group(3) if url else match.group(0)
+
+        nav = fragments.get("nav.html")
+        for name, html in page_sources.items():
+            if nav is not None and NAV_PLACEHOLDER in html:
+                # Inline the nav; nav-loader.js then only wires up the menu
+                html = html.replace(
+                    NAV_PLACEHOLDER, f'<div id="nav-placeholder">\n{nav}</div>'
+                )
+            html = ASSET_REF.sub(fingerprint, html)
+            pages[name] = Asset(html.encode("utf-8"), "text/html", REVALIDATE)
+
+        self.urls, self.assets, self.pages = urls, assets, pages
+        self._mtime = self._latest_mtime()
+        print(f"Static assets: {len(assets)} fingerprinted, {len(pages)} pages")
+
+    def _refresh(self) -> None:
+        if not self.pages or (self.auto_reload and self._latest_mtime() != self._mtime):
+            self.load()
+
+    def page(self, request: Request, name: str) -> Response:
+        self._refresh()
+        return self.pages[name].response(request)
+
+    def asset(self, request: Request, filename: str) -> Response:
+        self._refresh()
+        asset = self.assets.get(filename)
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        return asset.response(request)
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that sets Cache-Control per file name."""
+
+    def __init__(self, *args, cache_control: Callable[[str], str], **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result
+        )
+        response.headers["Cache-Control"] = self.cache_control(
+            os.path.basename(full_path)
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def image_cache_control(name: str) -> str:
+    return IMMUTABLE if CONTENT_ADDRESSED.match(name) else REVALIDATE
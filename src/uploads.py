@@ -0,0 +1,349 @@
+# PI: Uploads - shared admin upload service (limits, atomic writes, hashing)
+from typing import BinaryIO, Iterable, List, NamedTuple, Optional, Set, Tuple
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from src.db import IMAGE_COLUMNS
+from src.db_ops import AsyncDatabase, Database
+from src.images import (
+    VARIANT_NAME,
+    VARIANTS,
+    is_resizable,
+    is_variant,
+    local_image_path,
+    variant_file,
+    variant_worker,
+)
+from src.utils import config
+
+CHUNK_SIZE = 1024 * 1024
+
+# images/<folder> directories the upload endpoints write to
+UPLOAD_FOLDERS = ("cars", "spots", "last_trips")
+
+# <sha256><ext>, stored as <folder>/<hash[:2]>/<hash[2:4]>/<name>
+STORED_NAME = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]+)?$")
+# <name>_<YYYYmmddHHMMSSffffff><ext> from before uploads were content-addressed
+LEGACY_NAME = re.compile(r"_\d{20}(\.[A-Za-z0-9]+)?$")
+TEMP_PREFIX = ".upload-"
+
+# Every image path column in one statement; only the batch GC and admin
+# deletes run it, so reading the catalog in full is expected.
+IMAGE_REFERENCES_SQL = """
+    SELECT images FROM cars /* full scan */
+    UNION ALL SELECT images FROM picnic_spots
+    UNION ALL SELECT trip_images FROM picnic_spots
+    UNION ALL SELECT hotel_images FROM picnic_spots
+    UNION ALL SELECT images FROM last_trips
+"""
+
+
+def format_mb(n_bytes: int) -> str:
+    """A byte limit in MB as configured, e.g. "0.5 MB" (rounded to 0.01)."""
+    return f"{round(n_bytes / (1024 * 1024), 2):g} MB"
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, detail: str) -> None:
+        super().__init__(status_code=413, detail=detail)
+
+
+class StoredUpload(NamedTuple):
+    path: str  # URL path, e.g. /images/cars/ab/cd/abcd...jpg
+    sha256: str
+    size: int
+    duplicate: bool  # identical content was already stored
+
+
+def safe_extension(filename: Optional[str]) -> str:
+    """Lower-cased extension of an uploaded file name, safe for the filesystem."""
+    _, ext = os.path.splitext(filename or "")
+    return re.sub(r"[^a-z0-9.]+", "", ext.lower())
+
+
+def image_paths(value: Optional[str]) -> List[str]:
+    """Entries of a JSON image column; [] for NULL or malformed values."""
+    try:
+        paths = json.loads(value) if value else []
+    except ValueError:
+        return []
+    return [p for p in paths if isinstance(p, str)] if isinstance(paths, list) else []
+
+
+def referenced_images(database: Database) -> Set[str]:
+    """Every path named by an image column of any catalog row."""
+    referenced = set()
+    for (value,) in database.fetchall(IMAGE_REFERENCES_SQL):
+        referenced.update(image_paths(value))
+    return referenced
+
+
+async def row_images(db: AsyncDatabase, table: str, row_id: int) -> List[str]:
+    """Image paths a catalog row references, read before it is changed."""
+    columns = IMAGE_COLUMNS[table]
+    row = await db.fetchone(
+        f"SELECT {', '.join(columns)} FROM {table} WHERE id = ?", (row_id,)
+    )
+    if not row:
+        return []
+    return [path for value in row for path in image_paths(value)]
+
+
+class UploadStore:
+    """
+    Content-addressed store for admin uploads under images/<folder>/.
+
+    Files are streamed in chunks off the event loop to a temp file, hashed
+    while being written and then renamed to a path derived from the hash, so
+    readers never see a partial image and the same bytes are stored once.
+    A stored file is deleted once no catalog row references it and it is
+    older than the grace period (re-uploads refresh its age), which keeps a
+    file that was just uploaded for a row that isn't saved yet.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_file_bytes: int,
+        min_age_seconds: float,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> None:
+        self.root = root
+        self.max_file_bytes = max_file_bytes
+        self.min_age_seconds = min_age_seconds
+        self.chunk_size = chunk_size
+
+    def _too_large(self) -> UploadTooLarge:
+        return UploadTooLarge(
+            f"File exceeds the {format_mb(self.max_file_bytes)} upload limit"
+        )
+
+    def _copy(self, src: BinaryIO, folder: str, ext: str) -> StoredUpload:
+        directory = os.path.join(self.root, folder)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=TEMP_PREFIX, suffix=".tmp", dir=directory
+        )
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                src.seek(0)
+                while True:
+                    chunk = src.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_file_bytes:
+                        raise self._too_large()
+                    digest.update(chunk)
+                    out.write(chunk)
+            sha256 = digest.hexdigest()
+            shard = os.path.join(sha256[:2], sha256[2:4])
+            name = f"{sha256}{ext}"
+            dest = os.path.join(directory, shard, name)
+            duplicate = os.path.exists(dest)
+            if duplicate:
+                # Same bytes already stored: keep that copy and restart its grace period
+                os.unlink(tmp_path)
+                os.utime(dest)
+            else:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                # mkstemp creates 0600 files; images are served to everyone
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, dest)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        path = "/" + "/".join([self.root, folder, sha256[:2], sha256[2:4], name])
+        return StoredUpload(path, sha256, size, duplicate)
+
+    async def save(self, files: List[UploadFile], folder: str) -> List[StoredUpload]:
+        """Store every file under images/<folder>/; 413 if any is over the limit."""
+        # Starlette already knows each part's size; refuse before copying anything
+        for file in files:
+            if file.size is not None and file.size > self.max_file_bytes:
+                raise self._too_large()
+        stored = []
+        for file in files:
+            ext = safe_extension(file.filename)
+            try:
+                stored.append(
+                    await run_in_threadpool(self._copy, file.file, folder, ext)
+                )
+            finally:
+                await file.close()
+        # Resized variants are written in the background
+        variant_worker.submit([s.path for s in stored], folder)
+        return stored
+
+    def local_path(self, path: str) -> Optional[str]:
+        """Filesystem path of a /images/<folder>/... URL inside the store, else None."""
+        local = local_image_path(path, self.root)
+        if not local or len(local.split(os.sep)) < 3:
+            return None
+        return local if local.split(os.sep)[1] in UPLOAD_FOLDERS else None
+
+    def _remove(self, local: str, dry_run: bool = False) -> int:
+        """
+        Delete one file, its resized variants and any shard directories left
+        empty; returns the bytes freed (or that would be, with dry_run).
+        """
+        files = [local]
+        if is_resizable(local):
+            files += [variant_file(local, v) for v in VARIANTS]
+        freed = 0
+        for path in files:
+            try:
+                size = os.path.getsize(path)
+                if not dry_run:
+                    os.unlink(path)
+            except FileNotFoundError:
+                continue
+            freed += size
+        if dry_run:
+            return freed
+        directory = os.path.dirname(local)
+        top = os.path.join(self.root, local.split(os.sep)[1])
+        while directory != top:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+        return freed
+
+    def _release(self, paths: Iterable[str], referenced: Set[str]) -> int:
+        keep = {self.local_path(p) for p in referenced}
+        cutoff = time.time() - self.min_age_seconds
+        freed = 0
+        for path in set(paths):
+            local = self.local_path(path)
+            if not local or local in keep:
+                continue
+            if not STORED_NAME.match(os.path.basename(local)):
+                continue
+            try:
+                if os.path.getmtime(local) > cutoff:
+                    continue
+                freed += self._remove(local)
+            except OSError as e:
+                print(f"Could not remove {local}: {e}")
+        return freed
+
+    async def release(self, db: AsyncDatabase, paths: Iterable[str]) -> int:
+        """
+        Delete stored files among paths that no row references any more.
+        Call after the row change that dropped them; returns bytes freed.
+        """
+        paths = list(paths)
+        if not paths:
+            return 0
+        referenced = await db.run(referenced_images, db.sync)
+        return await run_in_threadpool(self._release, paths, referenced)
+
+    def collect_garbage(
+        self,
+        referenced: Set[str],
+        min_age_seconds: float,
+        include_legacy: bool = False,
+        dry_run: bool = False,
+    ) -> Tuple[List[Tuple[str, int]], int]:
+        """
+        Find (and unless dry_run, delete) unreferenced uploads older than
+        min_age_seconds with their variants, plus variants whose original is
+        gone and temp files left by interrupted uploads.
+        Returns ([(path, bytes incl. variants), ...], bytes freed).
+        """
+        keep = {self.local_path(p) for p in referenced}
+        cutoff = time.time() - min_age_seconds
+        removed = []
+        freed = 0
+        for folder in UPLOAD_FOLDERS:
+            for directory, _, names in os.walk(os.path.join(self.root, folder)):
+                stems = {
+                    os.path.splitext(n)[0]
+                    for n in names
+                    if not is_variant(n) and not n.startswith(TEMP_PREFIX)
+                }
+                for name in names:
+                    local = os.path.normpath(os.path.join(directory, name))
+                    stored = STORED_NAME.match(name)
+                    legacy = include_legacy and LEGACY_NAME.search(name)
+                    temp = name.startswith(TEMP_PREFIX)
+                    orphan = (
+                        is_variant(name) and VARIANT_NAME.sub("", name) not in stems
+                    )
+                    if local in keep or not (stored or legacy or temp or orphan):
+                        continue
+                    try:
+                        # Variants of a file removed earlier in this pass are gone
+                        if os.path.getmtime(local) > cutoff:
+                            continue
+                    except FileNotFoundError:
+                        continue
+                    size = self._remove(local, dry_run)
+                    removed.append((local, size))
+                    freed += size
+        return removed, freed
+
+
+class UploadLimitMiddleware:
+    """
+    Caps the request body size of upload routes. A declared Content-Length
+    over the limit is refused before any of the body is read; otherwise the
+    byte count is checked as the body streams in, so a chunked request can't
+    spool more than max_bytes to disk either.
+    """
+
+    def __init__(self, app, path_prefix: str, max_bytes: int) -> None:
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_bytes = max_bytes
+
+    def _detail(self) -> str:
+        return f"Upload exceeds the {format_mb(self.max_bytes)} request limit"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        declared = headers.get(b"content-length")
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            response = JSONResponse({"detail": self._detail()}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside body parsing; FastAPI turns it into the 413
+                    raise UploadTooLarge(self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+upload_store = UploadStore(
+    root="images",
+    max_file_bytes=int(config.UPLOAD_MAX_FILE_MB * 1024 * 1024),
+    min_age_seconds=config.UPLOAD_GC_MIN_AGE_HOURS * 3600,
+)
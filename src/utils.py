@@ -12,8 +12,187 @@ class Config:
         self.HOST = os.getenv("HOST", "0.0.0.0")
         self.PORT = int(os.getenv("PORT", "5000"))
         self.OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+        self.OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        # Any OpenAI-compatible endpoint (proxy, local model server, ...)
+        self.OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
+        # Concurrent upstream chat calls; a request waits this long for a
+        # slot before getting the canned reply instead
+        self.OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+        self.OPENAI_QUEUE_TIMEOUT_SECONDS = float(
+            os.getenv("OPENAI_QUEUE_TIMEOUT_SECONDS", "0.5")
+        )
+        # Whole-reply deadline, including a streamed one
+        self.OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "20"))
+        self.OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+        # Catalog listings retrieved into each chat prompt (and used by the
+        # offline fallback)
+        self.CHAT_RETRIEVAL_TOP_K = int(os.getenv("CHAT_RETRIEVAL_TOP_K", "5"))
+        # chat_logs writes: "batched" queues rows and commits them together
+        # every CHAT_LOG_FLUSH_MS or CHAT_LOG_BATCH_SIZE rows (a crash loses
+        # at most that window); "sync" commits each row before replying
+        self.CHAT_LOG_DURABILITY = os.getenv("CHAT_LOG_DURABILITY", "batched").lower()
+        self.CHAT_LOG_FLUSH_MS = float(os.getenv("CHAT_LOG_FLUSH_MS", "50"))
+        self.CHAT_LOG_BATCH_SIZE = int(os.getenv("CHAT_LOG_BATCH_SIZE", "200"))
+        self.CHAT_LOG_MAX_QUEUE = int(os.getenv("CHAT_LOG_MAX_QUEUE", "10000"))
+        # A batch failing CHAT_LOG_MAX_RETRIES more times is dropped; with the
+        # queue full a request waits CHAT_LOG_QUEUE_TIMEOUT_MS, then writes
+        # its own row
+        self.CHAT_LOG_MAX_RETRIES = int(os.getenv("CHAT_LOG_MAX_RETRIES", "5"))
+        self.CHAT_LOG_QUEUE_TIMEOUT_MS = float(
+            os.getenv("CHAT_LOG_QUEUE_TIMEOUT_MS", "1000")
+        )
+        # archive_chat_logs.py: rows older than CHAT_LOG_HOT_DAYS move to
+        # monthly chat_logs_YYYYMM tables, CHAT_LOG_ARCHIVE_BATCH rows per
+        # transaction with a pause in between; partitions older than
+        # CHAT_LOG_ARCHIVE_KEEP_MONTHS are dropped (0 keeps them all)
+        self.CHAT_LOG_HOT_DAYS = float(os.getenv("CHAT_LOG_HOT_DAYS", "30"))
+        self.CHAT_LOG_ARCHIVE_BATCH = int(os.getenv("CHAT_LOG_ARCHIVE_BATCH", "500"))
+        self.CHAT_LOG_ARCHIVE_PAUSE_MS = float(
+            os.getenv("CHAT_LOG_ARCHIVE_PAUSE_MS", "50")
+        )
+        self.CHAT_LOG_ARCHIVE_KEEP_MONTHS = int(
+            os.getenv("CHAT_LOG_ARCHIVE_KEEP_MONTHS", "0")
+        )
+        # Recent messages kept in memory per chat session (at least the
+        # /api/chat/history default of 50), for this many sessions / MB
+        self.CHAT_HISTORY_BUFFER = int(os.getenv("CHAT_HISTORY_BUFFER", "50"))
+        self.CHAT_HISTORY_MAX_SESSIONS = int(
+            os.getenv("CHAT_HISTORY_MAX_SESSIONS", "5000")
+        )
+        self.CHAT_HISTORY_MAX_MB = float(os.getenv("CHAT_HISTORY_MAX_MB", "32"))
+        # Chat reply cache. CHAT_CACHE_SIMILARITY is the word-overlap ratio
+        # (0-1) at which a different wording reuses a cached reply; 0 means
+        # exact (normalized) matches only.
+        self.CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "512"))
+        self.CHAT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "3600"))
+        self.CHAT_CACHE_SIMILARITY = float(os.getenv("CHAT_CACHE_SIMILARITY", "0"))
         self.WHATSAPP_PHONE = os.getenv("WHATSAPP_PHONE", "+919876543210")
 
+        # SQLite connection pool shared by all routers
+        self.DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+        self.DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+        # Threads running queries for async handlers (defaults to pool size)
+        self.DB_EXECUTOR_WORKERS = int(
+            os.getenv("DB_EXECUTOR_WORKERS", str(self.DB_POOL_SIZE))
+        )
+
+        # SQLite pragma profile applied to every pooled connection.
+        # WAL lets catalog reads proceed while chat logs are being written.
+        self.DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+        self.DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+        self.DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+        # Negative cache_size is in KiB (-16000 = ~16MB per connection)
+        self.DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-16000"))
+        self.DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(128 * 1024 * 1024)))
+        self.DB_TEMP_STORE = os.getenv("DB_TEMP_STORE", "MEMORY")
+
+        # Cached catalog responses kept per table (lists + detail views)
+        self.CATALOG_CACHE_MAX_ENTRIES = int(
+            os.getenv("CATALOG_CACHE_MAX_ENTRIES", "256")
+        )
+        # Cache-Control for catalog responses. "no-cache" still lets browsers
+        # and CDNs store them, but revalidate with If-None-Match (cheap 304s)
+        # so admin edits show up immediately. Raise max-age to trade freshness
+        # for fewer requests.
+        self.CACHE_CONTROL_CATALOG_LIST = os.getenv(
+            "CACHE_CONTROL_CATALOG_LIST", "public, no-cache"
+        )
+        self.CACHE_CONTROL_CATALOG_DETAIL = os.getenv(
+            "CACHE_CONTROL_CATALOG_DETAIL", "public, no-cache"
+        )
+
+        # User sessions: lifetime, in-memory token cache and expiry sweep
+        self.SESSION_TTL_HOURS = float(os.getenv("SESSION_TTL_HOURS", "168"))
+        self.SESSION_CACHE_TTL_SECONDS = float(
+            os.getenv("SESSION_CACHE_TTL_SECONDS", "60")
+        )
+        self.SESSION_CACHE_MAX_ENTRIES = int(
+            os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000")
+        )
+        self.SESSION_SWEEP_INTERVAL_SECONDS = float(
+            os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "3600")
+        )
+
+        # Password hashing: bcrypt cost and the bounded pool it runs on.
+        # Raising BCRYPT_ROUNDS upgrades existing hashes at their next login.
+        self.BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+        self.PASSWORD_HASH_WORKERS = int(
+            os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+        )
+        self.PASSWORD_HASH_MAX_PENDING = int(
+            os.getenv("PASSWORD_HASH_MAX_PENDING", "32")
+        )
+
+        # Token-bucket limits on public write endpoints, "<requests>/<seconds>"
+        # per client (chat session or login token when the body names one,
+        # else the IP). All clients of one IP together get
+        # RATE_LIMIT_IP_FACTOR times that. RATE_LIMIT_REDIS_URL shares the
+        # buckets between workers (needs the redis package); without it each
+        # process keeps up to RATE_LIMIT_MAX_KEYS buckets in memory.
+        self.RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        self.RATE_LIMIT_CHAT = os.getenv("RATE_LIMIT_CHAT", "20/60")
+        self.RATE_LIMIT_CHAT_PLAN = os.getenv("RATE_LIMIT_CHAT_PLAN", "5/300")
+        self.RATE_LIMIT_COMMENTS = os.getenv("RATE_LIMIT_COMMENTS", "5/60")
+        self.RATE_LIMIT_REGISTER = os.getenv("RATE_LIMIT_REGISTER", "5/3600")
+        self.RATE_LIMIT_IP_FACTOR = float(os.getenv("RATE_LIMIT_IP_FACTOR", "4"))
+        self.RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+        # Take the client IP from X-Forwarded-For (only behind a proxy that
+        # sets it, or clients can pick their own IP)
+        self.RATE_LIMIT_TRUST_PROXY = os.getenv(
+            "RATE_LIMIT_TRUST_PROXY", "false"
+        ).lower() in ("1", "true", "yes")
+        self.RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+
+        # Admin auth: /api/admin/login issues HMAC-signed bearer tokens. Set
+        # ADMIN_TOKEN_SECRET to share tokens across workers and restarts.
+        # ADMIN_LEGACY_CREDENTIALS keeps accepting username/password in admin
+        # request bodies for clients that don't send a token yet.
+        self.ADMIN_TOKEN_SECRET = os.getenv("ADMIN_TOKEN_SECRET", "")
+        self.ADMIN_TOKEN_TTL_MINUTES = float(os.getenv("ADMIN_TOKEN_TTL_MINUTES", "60"))
+        self.ADMIN_LEGACY_CREDENTIALS = os.getenv(
+            "ADMIN_LEGACY_CREDENTIALS", "true"
+        ).lower() in ("1", "true", "yes")
+
+        # Admin image/video uploads: largest single file and whole request
+        self.UPLOAD_MAX_FILE_MB = float(os.getenv("UPLOAD_MAX_FILE_MB", "50"))
+        self.UPLOAD_MAX_REQUEST_MB = float(os.getenv("UPLOAD_MAX_REQUEST_MB", "200"))
+        # Unreferenced uploads younger than this are kept (see gc_images.py)
+        self.UPLOAD_GC_MIN_AGE_HOURS = float(os.getenv("UPLOAD_GC_MIN_AGE_HOURS", "24"))
+
+        # Resized WebP variants of uploaded images (needs Pillow)
+        self.IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+        self.IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+
+        # Rebuild fingerprinted assets/pages when files in public/ change
+        # (for development; production builds them once at startup)
+        self.STATIC_AUTO_RELOAD = os.getenv("STATIC_AUTO_RELOAD", "false").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+
+        # Response compression: bodies smaller than COMPRESSION_MIN_BYTES go
+        # out as-is. GZIP_LEVEL/BROTLI_QUALITY apply to per-request
+        # compression. Cached catalog bodies are compressed once per table
+        # change, on the request that misses, so they get moderate levels;
+        # only static assets are compressed once at the maximum.
+        self.COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+        self.GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+        self.BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+        self.CATALOG_GZIP_LEVEL = int(os.getenv("CATALOG_GZIP_LEVEL", "6"))
+        self.CATALOG_BROTLI_QUALITY = int(os.getenv("CATALOG_BROTLI_QUALITY", "5"))
+
+        # Page sizes for /api/cars and /api/spots
+        self.CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "50"))
+        self.CATALOG_MAX_PAGE_SIZE = int(os.getenv("CATALOG_MAX_PAGE_SIZE", "200"))
+        # Page sizes for last trip comments (the trip detail embeds page one)
+        self.COMMENTS_PAGE_SIZE = int(os.getenv("COMMENTS_PAGE_SIZE", "20"))
+        self.COMMENTS_MAX_PAGE_SIZE = int(os.getenv("COMMENTS_MAX_PAGE_SIZE", "100"))
+
     def __repr__(self):
         return f"Config(HOST={self.HOST}, PORT={self.PORT}, OPENAI_API_KEY={'***' if self.OPENAI_API_KEY else 'Not Set'})"
 
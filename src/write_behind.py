@@ -0,0 +1,198 @@
+# PI: WriteBehind - batched inserts for append-only tables
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+import asyncio
+
+from src.db_ops import AsyncDatabase
+
+Row = Sequence[Any]
+
+
+class BatchWriter:
+    """
+    Write-behind queue for one INSERT statement.
+
+    With durability "batched", write() queues the row and returns; a
+    background task writes queued rows with one executemany() per
+    transaction, as soon as max_batch rows are waiting or interval seconds
+    after the first one arrived. Rows still queued are lost if the process
+    dies, so at most about interval seconds of rows are at risk; stop()
+    flushes them on a clean shutdown. When max_queue rows are waiting,
+    write() waits up to queue_timeout seconds for the next flush to make
+    room, then commits its row itself (or drops it if that fails too).
+    A batch that fails max_retries times in a row is dropped (and
+    counted) rather than retried forever.
+
+    With durability "sync" (or before start()), write() commits the row
+    before returning.
+    """
+
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        sql: str,
+        durability: str,
+        max_batch: int,
+        interval: float,
+        max_queue: int,
+        max_retries: int,
+        queue_timeout: float,
+    ) -> None:
+        if durability not in ("sync", "batched"):
+            raise ValueError(f"Unknown durability mode: {durability!r}")
+        self.db = db
+        self.sql = sql
+        self.durability = durability
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self._rows: Deque[Row] = deque()
+        self._in_flight: List[Row] = []
+        self._has_rows = asyncio.Event()
+        self._full = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional["asyncio.Task[None]"] = None
+        # Failed attempts at the batch at the head of the queue
+        self._retries = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.waits = 0
+        self.wait_timeouts = 0
+        self.dropped = 0
+
+    def _write(self, rows: List[Row]) -> None:
+        with self.db.sync.transaction() as conn:
+            conn.executemany(self.sql, rows)
+
+    async def write(self, row: Row) -> None:
+        if self.durability == "sync" or self._task is None:
+            await self.db.run(self._write, [row])
+            self.written += 1
+            return
+        deadline = asyncio.get_running_loop().time() + self.queue_timeout
+        while len(self._rows) >= self.max_queue:
+            # Backpressure: wait for the writer instead of growing without bound
+            self.waits += 1
+            self._space.clear()
+            self._full.set()
+            remaining = deadline - asyncio.get_running_loop().time()
+            try:
+                await asyncio.wait_for(self._space.wait(), timeout=max(0, remaining))
+            except asyncio.TimeoutError:
+                # The writer is stuck (locked or broken database): don't
+                # hang the request on it
+                self.wait_timeouts += 1
+                await self._write_now(row)
+                return
+        self._rows.append(row)
+        self._has_rows.set()
+        if len(self._rows) >= self.max_batch:
+            self._full.set()
+
+    async def _write_now(self, row: Row) -> None:
+        try:
+            await self.db.run(self._write, [row])
+        except Exception as e:
+            self.dropped += 1
+            print(f"Chat log queue full and direct write failed, dropped row: {e}")
+        else:
+            self.written += 1
+
+    def _failed(self, rows: List[Row], error: Exception) -> None:
+        """Put a failed batch back (in order) for the next attempt, or drop it."""
+        self.failures += 1
+        self._retries += 1
+        if self._retries > self.max_retries:
+            self._retries = 0
+            self.dropped += len(rows)
+            print(
+                f"Batched write failed {self.max_retries + 1} times, dropped {len(rows)} rows: {error}"
+            )
+            return
+        self._rows.extendleft(reversed(rows))
+        print(f"Batched write failed, will retry: {error}")
+
+    async def flush(self) -> None:
+        """Write every queued row now."""
+        async with self._flush_lock:
+            while self._rows:
+                count = min(self.max_batch, len(self._rows))
+                self._in_flight = rows = [self._rows.popleft() for _ in range(count)]
+                # The executor thread can't be interrupted, so when stop()
+                # cancels us mid-batch we still wait for the batch's outcome
+                # rather than lose track of its rows
+                write = asyncio.ensure_future(self.db.run(self._write, rows))
+                cancelled = False
+                try:
+                    try:
+                        await asyncio.shield(write)
+                    except asyncio.CancelledError:
+                        cancelled = True
+                        await write
+                except Exception as e:
+                    self._failed(rows, e)
+                    if not cancelled:
+                        raise
+                else:
+                    self._retries = 0
+                    self.written += count
+                    self.batches += 1
+                finally:
+                    self._in_flight = []
+                    self._space.set()
+                if cancelled:
+                    raise asyncio.CancelledError
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_rows.wait()
+            if len(self._rows) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._has_rows.clear()
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception:
+                await asyncio.sleep(self.interval)
+            if self._rows:
+                self._has_rows.set()
+
+    def start(self) -> None:
+        if self.durability == "batched" and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write whatever is still queued."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        try:
+            await self.flush()
+        except Exception:
+            print(f"Dropped {len(self._rows)} queued rows at shutdown")
+
+    def pending(self, predicate: Callable[[Row], bool]) -> List[Row]:
+        """Queued rows not yet committed that match predicate, oldest first."""
+        return [row for row in [*self._in_flight, *self._rows] if predicate(row)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "durability": self.durability,
+            "queued": len(self._rows) + len(self._in_flight),
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "backpressure_waits": self.waits,
+            "backpressure_timeouts": self.wait_timeouts,
+            "dropped": self.dropped,
+        }
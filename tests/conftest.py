@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Replies of the fake model; a prompt containing SLOW_WORD takes longer than
+# the app's OPENAI_TIMEOUT_SECONDS
+FAKE_CHUNKS = ["Hello", " there", ", ", "traveller"]
+FAKE_REPLY = "Full reply from the fake model"
+SLOW_WORD = "slowly"
+TIMEOUT_SECONDS = 1.0
+
+
+async def fake_completions(request):
+    """Minimal OpenAI-compatible /v1/chat/completions."""
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    delay = TIMEOUT_SECONDS * 3 if SLOW_WORD in prompt else 0.01
+    if body.get("stream"):
+
+        async def chunks():
+            for text in FAKE_CHUNKS:
+                await asyncio.sleep(delay)
+                chunk = {
+                    "id": "chatcmpl-test",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": body["model"],
+                    "choices": [
+                        {"index": 0, "delta": {"content": text}, "finish_reason": None}
+                    ],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+    await asyncio.sleep(delay)
+    return JSONResponse(
+        {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": FAKE_REPLY},
+                    "finish_reason": "stop",
+                }
+            ],
+        }
+    )
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def fake_openai():
+    """Base URL of a fake OpenAI server running in a background thread."""
+    app = Starlette(
+        routes=[Route("/v1/chat/completions", fake_completions, methods=["POST"])]
+    )
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Fake OpenAI server did not start")
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}/v1"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture(scope="session")
+def app(fake_openai, tmp_path_factory):
+    """
+    The app against the fake model, with its database and uploads in a
+    temporary directory. Settings are read once at import, so they are set
+    before main is first imported.
+    """
+    workdir = tmp_path_factory.mktemp("app")
+    os.symlink(os.path.join(ROOT, "public"), workdir / "public")
+    (workdir / "images").mkdir()
+    os.chdir(workdir)
+    os.environ.update(
+        {
+            "OPENAI_API_KEY": "test-key",
+            "OPENAI_BASE_URL": fake_openai,
+            "OPENAI_MAX_CONCURRENCY": "1",
+            "OPENAI_QUEUE_TIMEOUT_SECONDS": "0.2",
+            "OPENAI_TIMEOUT_SECONDS": str(TIMEOUT_SECONDS),
+            "OPENAI_MAX_RETRIES": "0",
+            "RATE_LIMIT_ENABLED": "false",
+        }
+    )
+    sys.path.insert(0, ROOT)
+    # A fresh install: init_db() on import, then the migration script
+    import src.db_ops
+    from migrate_database import migrate_database
+
+    assert migrate_database(str(workdir / "rental.db"))
+    src.db_ops.init_db()
+    from main import app
+
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,23 @@
+def test_comments_keep_cached_replies(client):
+    from src.cache import catalog_cache
+    from src.db_ops import db
+    from src.llm import reply_cache
+
+    trip_id = db.insert(
+        """
+        INSERT INTO last_trips
+            (destination, spots, days, persons, images, start_date, end_date,
+             created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+        ("Coorg", "[]", 2, 4, "[]", "2026-01-10", "2026-01-12", "2026-01-13"),
+    )
+    generation = reply_cache.generation
+    res = client.post(
+        f"/api/last_trips/{trip_id}/comments", json={"name": "Asha", "comment": "Nice"}
+    )
+    assert res.status_code == 200
+    assert reply_cache.generation == generation
+
+    catalog_cache.invalidate("last_trips", trip_id)
+    assert reply_cache.generation == generation + 1
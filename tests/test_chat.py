@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+
+from conftest import FAKE_CHUNKS, FAKE_REPLY, SLOW_WORD, TIMEOUT_SECONDS
+
+
+def parse_sse(text):
+    """[(event name, data)] of a server-sent event stream."""
+    events = []
+    for block in text.split("\n\n"):
+        if not block:
+            continue
+        name, data = "message", []
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                name = line[len("event: ") :]
+            elif line.startswith("data: "):
+                data.append(line[len("data: ") :])
+        events.append((name, json.loads("\n".join(data))))
+    return events
+
+
+def test_chat_reply_comes_from_the_model(client):
+    res = client.post(
+        "/api/chat", json={"session_id": "reply", "message": "Which car fits six?"}
+    )
+    assert res.status_code == 200
+    assert res.json()["reply"] == FAKE_REPLY
+
+
+def test_chat_stream_sends_deltas_then_done(client):
+    res = client.post(
+        "/api/chat/stream",
+        json={"session_id": "stream", "message": "Suggest a weekend trip"},
+    )
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/event-stream")
+    assert res.text.endswith("\n\n")
+    events = parse_sse(res.text)
+    assert events[:-1] == [("message", {"delta": chunk}) for chunk in FAKE_CHUNKS]
+    assert events[-1] == ("done", {"reply": "".join(FAKE_CHUNKS), "user_email": None})
+
+
+def test_saturated_limiter_falls_back_to_canned_reply(client):
+    from src.api.chat import generate_reply
+    from src.llm import chat_model
+
+    saturated = chat_model.limiter.saturated
+    # Holds the only upstream slot until it times out
+    slow = threading.Thread(
+        target=client.post,
+        args=("/api/chat",),
+        kwargs={"json": {"session_id": "busy", "message": f"answer {SLOW_WORD}"}},
+    )
+    slow.start()
+    time.sleep(TIMEOUT_SECONDS * 0.3)
+    message = "Do you rent electric cars?"
+    res = client.post("/api/chat", json={"session_id": "waiting", "message": message})
+    slow.join()
+    assert res.json()["reply"] == generate_reply(message)
+    assert chat_model.limiter.saturated == saturated + 1
+
+
+def test_upstream_timeout_falls_back_to_canned_reply(client):
+    from src.api.chat import generate_reply
+    from src.llm import chat_model
+
+    failed = chat_model.limiter.failed
+    message = f"reply {SLOW_WORD} please"
+    started = time.monotonic()
+    res = client.post("/api/chat", json={"session_id": "timeout", "message": message})
+    assert time.monotonic() - started < TIMEOUT_SECONDS * 2
+    assert res.json()["reply"] == generate_reply(message)
+    assert chat_model.limiter.failed == failed + 1
+
+
+def test_stream_timeout_sends_canned_reply(client):
+    from src.api.chat import generate_reply
+
+    message = f"stream {SLOW_WORD} please"
+    res = client.post(
+        "/api/chat/stream", json={"session_id": "stream-timeout", "message": message}
+    )
+    fallback = generate_reply(message)
+    assert parse_sse(res.text) == [
+        ("message", {"delta": fallback}),
+        ("done", {"reply": fallback, "user_email": None}),
+    ]
@@ -0,0 +1,23 @@
+import base64
+import json
+
+
+def cursor_of(*parts):
+    raw = json.dumps(list(parts)).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def test_cursor_sort_values_must_be_scalars(client):
+    for value in ([1], {"a": 1}, True, None):
+        res = client.get(
+            "/api/cars",
+            params={"sort": "price_asc", "cursor": cursor_of("price_asc", value, 1)},
+        )
+        assert res.status_code == 400
+        assert res.json()["detail"] == "Invalid cursor"
+
+    res = client.get(
+        "/api/cars",
+        params={"sort": "price_asc", "cursor": cursor_of("price_asc", 1500, 1)},
+    )
+    assert res.status_code == 200
@@ -0,0 +1,37 @@
+import asyncio
+import re
+
+
+def limiter(capacity, ip_factor):
+    from src.rate_limit import MemoryBackend, RateLimiter, Rule
+
+    rule = Rule("chat", "POST", re.compile("/api/chat"), capacity, 0.001, True)
+    return rule, RateLimiter([rule], MemoryBackend(max_keys=100), ip_factor)
+
+
+def test_ip_and_shared_session_buckets_are_separate(app):
+    rule, rl = limiter(capacity=2, ip_factor=2)
+
+    def check(session):
+        return asyncio.run(rl.check(rule, "1.2.3.4", session))
+
+    # Session traffic uses up the shared allowance (2 x 2) ...
+    assert [check(f"session_id:{i}") for i in range(4)] == [0, 0, 0, 0]
+    assert check("session_id:5") > 0
+    # ... but not the IP's own bucket for requests naming no session
+    assert check(None) == 0
+    assert check(None) == 0
+    assert check(None) > 0
+
+
+def test_denied_request_keeps_its_session_token(app):
+    rule, rl = limiter(capacity=2, ip_factor=1)
+
+    def check(session):
+        return asyncio.run(rl.check(rule, "1.2.3.4", session))
+
+    assert check("session_id:a") == 0
+    assert check("session_id:b") == 0
+    # The shared IP bucket is empty, so b's own token is left alone
+    assert check("session_id:b") > 0
+    assert rl.backend._buckets["chat:session_id:b"][0] >= 1
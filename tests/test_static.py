@@ -0,0 +1,15 @@
+def test_if_none_match_is_parsed_as_a_list(client):
+    res = client.get("/cars.html", headers={"Accept-Encoding": "identity"})
+    assert res.status_code == 200
+    etag = res.headers["etag"]
+
+    def status(if_none_match):
+        headers = {"Accept-Encoding": "identity", "If-None-Match": if_none_match}
+        return client.get("/cars.html", headers=headers).status_code
+
+    assert status(etag) == 304
+    assert status(f'"other", W/{etag}') == 304
+    assert status("*") == 304
+    # Containing the tag isn't naming it
+    assert status(f'"x{etag.strip(chr(34))}x"') == 200
+    assert status('"other"') == 200
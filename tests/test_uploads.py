@@ -0,0 +1,9 @@
+def test_upload_limits_keep_fractional_megabytes(app):
+    from src.uploads import UploadLimitMiddleware, UploadStore, format_mb
+
+    assert format_mb(512 * 1024) == "0.5 MB"
+    assert format_mb(50 * 1024 * 1024) == "50 MB"
+    store = UploadStore(root="images", max_file_bytes=256 * 1024, min_age_seconds=0)
+    assert store._too_large().detail == "File exceeds the 0.25 MB upload limit"
+    middleware = UploadLimitMiddleware(app, "/api/admin/upload", 1536 * 1024)
+    assert middleware._detail() == "Upload exceeds the 1.5 MB request limit"
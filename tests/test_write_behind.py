@@ -0,0 +1,52 @@
+import asyncio
+
+
+def writer(tmp_path, sql, **kwargs):
+    from src.db_ops import AsyncDatabase, Database
+    from src.write_behind import BatchWriter
+
+    database = Database(str(tmp_path / "writes.db"))
+    database.execute("CREATE TABLE logs (message TEXT NOT NULL)")
+    options = dict(
+        durability="batched",
+        max_batch=10,
+        interval=0.01,
+        max_queue=2,
+        max_retries=1,
+        queue_timeout=0.05,
+    )
+    options.update(kwargs)
+    return database, BatchWriter(AsyncDatabase(database), sql, **options)
+
+
+def test_failing_batches_are_dropped_and_writes_do_not_hang(app, tmp_path):
+    _, w = writer(tmp_path, "INSERT INTO missing (message) VALUES (?)")
+
+    async def scenario():
+        w.start()
+        for i in range(5):
+            await asyncio.wait_for(w.write((f"m{i}",)), timeout=1)
+        await asyncio.sleep(0.2)
+        await w.stop()
+
+    asyncio.run(scenario())
+    stats = w.stats()
+    assert stats["written"] == 0
+    assert stats["dropped"] == 5
+    assert stats["queued"] == 0
+
+
+def test_stop_finishes_the_batch_in_flight(app, tmp_path):
+    database, w = writer(tmp_path, "INSERT INTO logs (message) VALUES (?)")
+
+    async def scenario():
+        w.start()
+        for i in range(2):
+            await w.write((f"m{i}",))
+        # Let the background flush start, then cancel it mid-write
+        await asyncio.sleep(0.015)
+        await w.stop()
+
+    asyncio.run(scenario())
+    assert w.written == 2
+    assert database.fetchone("SELECT COUNT(*) FROM logs")[0] == 2